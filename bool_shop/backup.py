@@ -0,0 +1,95 @@
+"""Онлайн-бэкап БД через SQLite backup API.
+
+Снимок снимается с отдельного read-only соединения шагами по BACKUP_PAGES
+страниц. Весь цикл копирования идёт в потоке aiosqlite: event loop, пул и
+очередь записи им не заняты, бот продолжает работать (в WAL чтение не
+мешает писателю). Пауз между шагами нет — sqlite3 спит BACKUP_SLEEP секунд
+только когда шаг вернул SQLITE_BUSY/SQLITE_LOCKED, и повторяет его.
+Готовый снимок проверяется ``PRAGMA integrity_check`` и только потом
+получает итоговое имя; старые снимки сверх BACKUP_KEEP удаляются.
+
+Снимки — копия базы с данными покупателей, поэтому по умолчанию они лежат
+вне пакета, в backups/ рядом с ним (в .gitignore); каталог можно задать
+переменной окружения BOOL_SHOP_BACKUP_DIR.
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import aiosqlite
+
+from bool_shop.db import BUSY_TIMEOUT_MS
+
+BACKUP_DIR = os.getenv(
+    "BOOL_SHOP_BACKUP_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backups"),
+)
+BACKUP_KEEP = 7
+BACKUP_PAGES = 64  # страниц за шаг
+BACKUP_SLEEP = 0.01  # сек перед повтором шага, если база занята (BUSY/LOCKED)
+BACKUP_CRON = "0 */6 * * *"  # каждые 6 часов, в начале часа
+
+_lock = asyncio.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+def list_backups(directory: str = BACKUP_DIR) -> list[Path]:
+    """Снимки от старых к новым (имя содержит время, сортировка по имени)"""
+    path = Path(directory)
+    if not path.exists():
+        return []
+    return sorted(path.glob("database-*.db"))
+
+
+def rotate(directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP) -> int:
+    backups = list_backups(directory)
+    stale = backups[:-keep] if keep else backups
+    for path in stale:
+        path.unlink(missing_ok=True)
+    return len(stale)
+
+
+async def check_integrity(path: str) -> str:
+    async with aiosqlite.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True) as conn:
+        cursor = await conn.execute("PRAGMA integrity_check")
+        rows = await cursor.fetchall()
+    return "; ".join(row[0] for row in rows)
+
+
+async def make_backup(source: str, directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP) -> Path:
+    """Снимает бэкап базы source, проверяет его и чистит старые. Возвращает путь к снимку"""
+    async with _lock:
+        os.makedirs(directory, exist_ok=True)
+        target = Path(directory) / time.strftime("database-%Y%m%d-%H%M%S.db", time.gmtime())
+        tmp = target.with_suffix(".tmp")
+
+        source_uri = Path(source).resolve().as_uri() + "?mode=ro"
+        try:
+            async with aiosqlite.connect(source_uri, uri=True) as src, aiosqlite.connect(tmp) as dest:
+                await src.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+                await src.backup(dest, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP)
+                # снимок наследует WAL от источника — переводим в обычный журнал,
+                # чтобы вся база лежала в одном файле
+                await dest.execute("PRAGMA journal_mode=DELETE")
+
+            result = await check_integrity(tmp)
+            if result != "ok":
+                raise BackupError(f"integrity_check: {result}")
+            os.replace(tmp, target)
+        finally:
+            for leftover in (tmp, Path(f"{tmp}-wal"), Path(f"{tmp}-shm")):
+                leftover.unlink(missing_ok=True)
+
+        rotate(directory, keep)
+        return target
+
+
+async def backup_job(source: str) -> Path:
+    """Фоновая задача: плановый бэкап базы source"""
+    path = await make_backup(source)
+    print(f"💾 Бэкап БД сохранён: {path.name}")
+    return path
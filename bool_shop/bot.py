@@ -1,24 +1,91 @@
 import asyncio
 import logging
+import os
 
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
 from bool_shop.bot_token import TOKEN
-from bool_shop.handlers import admin_handlers, order_handlers, user_handlers
-from bool_shop.db import init_db
+from bool_shop.handlers import setup_routers
+from bool_shop.db import CHECKPOINT_INTERVAL, SQLiteRepository
+from bool_shop.memory import MemoryRepository
+from bool_shop.repository import ARCHIVE_INTERVAL, RESERVATION_INTERVAL, archive_old_orders
+from bool_shop.backup import BACKUP_CRON, backup_job
+from bool_shop.cards import warm_up
+from bool_shop.throttling import RateLimiter
+from bool_shop.channel import CaptionDebouncer
+from bool_shop.outbox import OutboxSender
+from bool_shop.reservations import release_expired
+from bool_shop.scheduler import Scheduler
+from bool_shop.webhook import WEBHOOK_URL, run_webhook
+from bool_shop.middlewares import CallbackDedupMiddleware, FastAckMiddleware, UserOrderingMiddleware
+from bool_shop.fsm_storage import FSM_SWEEP_INTERVAL, SQLiteStorage
 
 logging.basicConfig(level=logging.DEBUG)
 
+POLLING_CONCURRENCY = 100  # апдейтов в обработке одновременно
+
 bot = Bot(token=TOKEN)
-dp = Dispatcher()
+limiter = RateLimiter()
+bot.session.middleware(limiter)  # лимиты Telegram и повтор на 429 для всех запросов
+fast_ack = FastAckMiddleware()
+bot.session.middleware(fast_ack.session_middleware)  # второй answer на то же нажатие не уходит
 
 
 async def main():
-    await init_db()  # проверка и создание таблицы
+    # BOOL_SHOP_STORAGE=memory — без диска, для нагрузочных прогонов
+    if os.getenv("BOOL_SHOP_STORAGE") == "memory":
+        repo = MemoryRepository()
+    else:
+        repo = SQLiteRepository()
+    await repo.open()  # проверка и миграция схемы
+    # состояния FSM в той же БД, чтобы оформление заказа пережило перезапуск
+    storage = SQLiteStorage(repo) if isinstance(repo, SQLiteRepository) else MemoryStorage()
+    captions = CaptionDebouncer(bot, repo)
+    scheduler = Scheduler()
+    # неоплаченные брони размеров возвращаются на склад; первый проход — сразу,
+    # брони могли истечь, пока бот лежал
+    scheduler.every("reservations", RESERVATION_INTERVAL, lambda: release_expired(repo, captions),
+                    jitter=5, at_start=True)
+    scheduler.every("archive", ARCHIVE_INTERVAL, lambda: archive_old_orders(repo), jitter=60)
+    scheduler.once("warmup", lambda: warm_up(repo))
+    if isinstance(repo, SQLiteRepository):
+        scheduler.cron("backup", BACKUP_CRON, lambda: backup_job(repo.path), jitter=60)
+        scheduler.every("wal_checkpoint", CHECKPOINT_INTERVAL, repo.checkpoint, jitter=10)
+        scheduler.every("fsm_sweep", FSM_SWEEP_INTERVAL, storage.sweep, jitter=60)
+    # хендлеры получают repo, captions, limiter и scheduler аргументами
+    dp = Dispatcher(storage=storage, repo=repo, captions=captions, limiter=limiter, scheduler=scheduler)
+    # задачи живут, пока работает диспетчер; при остановке дорабатывают до закрытия БД
+    dp.startup.register(scheduler.start)
+    dp.shutdown.register(scheduler.stop)
+    # разные пользователи — параллельно, один пользователь — по очереди
+    ordering = UserOrderingMiddleware()
+    dp.update.outer_middleware(ordering)
+    # двойное нажатие той же кнопки не запускает хендлер второй раз
+    dp.callback_query.outer_middleware(CallbackDedupMiddleware())
+    # часики на кнопке гаснут сразу, даже если хендлер долго пишет в БД
+    dp.callback_query.outer_middleware(fast_ack)
+    setup_routers(dp)
     print("🚀 База данных инициализирована, запускаем бота...")
-    dp.include_router(user_handlers.router)
-    dp.include_router(order_handlers.router)
-    dp.include_router(admin_handlers.router)
-    await dp.start_polling(bot)
+    # уведомления из outbox: хендлеры только пишут их в БД; не по расписанию, а по сигналу записи
+    sender = asyncio.create_task(OutboxSender(bot, repo).run())
+    try:
+        if WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            # после webhook-режима getUpdates вернёт Conflict, пока webhook не снят
+            await bot.delete_webhook()
+            await dp.start_polling(bot, handle_as_tasks=True, tasks_concurrency_limit=POLLING_CONCURRENCY)
+    finally:
+        # если диспетчер упал, не дойдя до shutdown; повторный stop ничего не делает
+        await scheduler.stop()
+        sender.cancel()
+        # отправитель может быть посреди чтения или записи пула — ждём, пока отменится
+        await asyncio.gather(sender, return_exceptions=True)
+        await ordering.close()
+        await fast_ack.close()
+        await captions.close()
+        await storage.close()
+        await repo.close()
 
 
 if __name__ == '__main__':
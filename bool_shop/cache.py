@@ -0,0 +1,65 @@
+import time
+from collections import OrderedDict
+
+_MISS = object()
+
+
+class SlotCache:
+    """LRU-кэш с TTL перед get_slot / get_slots.
+
+    Каждый ключ имеет версию. Её повышает invalidate(), а put() с версией,
+    взятой до чтения из БД, ничего не кэширует, если слот успели изменить.
+    Поэтому устаревшая запись не попадёт в кэш после инвалидации.
+    Значения отдаются как есть — вызывающий код не должен их менять.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+        self._versions: dict = {}
+        self._epoch = 0
+
+    def version(self, key):
+        return self._epoch, self._versions.get(key, 0)
+
+    def get(self, key, default=_MISS):
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key, version, value):
+        if version != self.version(key):
+            return
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """Без аргументов сбрасывает весь кэш"""
+        if not keys:
+            self._items.clear()
+            self._versions.clear()
+            self._epoch += 1
+            return
+        for key in keys:
+            self._items.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
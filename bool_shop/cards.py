@@ -0,0 +1,135 @@
+"""Готовые карточки слота: подписи и клавиатуры, собранные один раз.
+
+Подпись слота раньше собиралась f-строкой в каждом хендлере, а клавиатуры
+(pydantic-модели InlineKeyboardMarkup) валидировались заново на каждый
+переход по ссылке «Купить». Теперь slot_card(slot) отдаёт SlotCard из
+LRU-кэша: карточка пересобирается, только если изменилась версия слота —
+те поля, из которых она рендерится. Модели aiogram неизменяемы (frozen),
+поэтому одну и ту же клавиатуру можно отдавать во все запросы.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+import bool_shop.keyboards as kb
+from bool_shop.money import format_price
+
+CARD_CACHE_SIZE = 1024
+WARMUP_SLOTS = 256  # сколько последних слотов прогревать при старте
+
+
+class SlotCard(NamedTuple):
+    version: tuple
+    channel_caption: str  # пост в канале
+    channel_hash: str
+    product_kb: InlineKeyboardMarkup  # «Купить 🛒» под постом
+    offer_caption: str  # переход по ссылке из канала (/start <id>)
+    checkout_kb: InlineKeyboardMarkup
+    sizes_kb: InlineKeyboardMarkup  # выбор размера при оформлении
+    search_caption: str
+    admin_caption: str  # /slot
+
+
+def slot_version(slot) -> tuple:
+    """всё, из чего рендерится карточка: изменилось хоть что-то — карточка устарела"""
+    return slot["name"], slot["png"], slot["price"], slot["description"], tuple(slot["sizes"] or ())
+
+
+def caption_hash(caption: str) -> str:
+    return hashlib.blake2b(caption.encode(), digest_size=16).hexdigest()
+
+
+def render_card(slot, version: tuple) -> SlotCard:
+    slot_id = slot["id"]
+    price = format_price(slot["price"])
+    channel_caption = (
+        f"{slot['name']}\n"
+        f"Размеры: {slot['size'] or 'Нет в наличии'}\n"
+        f"Цена: {price}₽\n"
+        f"{slot['description']}\n\n"
+        f"👉 Жми кнопку ниже, чтобы заказать!"
+    )
+    return SlotCard(
+        version=version,
+        channel_caption=channel_caption,
+        channel_hash=caption_hash(channel_caption),
+        product_kb=kb.product_button(slot_id),
+        offer_caption=(
+            f"🛒     Вы выбрали товар:\n\n"
+            f"{slot['name']}\n"
+            f"Размер: {slot['size']}\n"
+            f"Цена: {price}₽"
+        ),
+        checkout_kb=kb.checkout_button(slot_id),
+        sizes_kb=kb.size_keyboard(slot_id, slot["sizes"] or ["—"]),
+        search_caption=(
+            f"🛒 {slot['name']}\n"
+            f"Размер: {slot['size'] or 'Нет в наличии'}\n"
+            f"Цена: {price}₽\n\n"
+            f"{slot['description'] or ''}"
+        ),
+        admin_caption=(
+            f"📦 Слот #{slot_id}\n\n"
+            f"Название: {slot['name']}\n"
+            f"Цена: {price}₽\n"
+            f"Размер: {slot.get('size', '—')}\n"
+            f"Описание: {slot.get('description', '—')}\n"
+        ),
+    )
+
+
+class CardCache:
+    """LRU slot_id -> SlotCard; запись с другой версией слота пересобирается"""
+
+    def __init__(self, maxsize: int = CARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[int, SlotCard] = OrderedDict()
+
+    def get(self, slot) -> SlotCard:
+        version = slot_version(slot)
+        card = self._items.get(slot["id"])
+        if card is not None and card.version == version:
+            self._items.move_to_end(slot["id"])
+            self.hits += 1
+            return card
+
+        self.misses += 1
+        card = self._items[slot["id"]] = render_card(slot, version)
+        self._items.move_to_end(slot["id"])
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return card
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+cards = CardCache()
+
+
+def slot_card(slot) -> SlotCard:
+    return cards.get(slot)
+
+
+async def warm_up(repo, limit: int = WARMUP_SLOTS) -> int:
+    """Фоновая задача при старте: последние слоты — в кэш слотов и в карточки,
+    чтобы первые переходы из канала после перезапуска не шли в БД"""
+    slots = (await repo.get_slots())[-limit:]
+    warmed = 0
+    for item in slots:
+        slot = await repo.get_slot(item["id"])
+        if slot:
+            slot_card(slot)
+            warmed += 1
+    print(f"🔥 Прогреты карточки слотов: {warmed}")
+    return warmed
@@ -0,0 +1,105 @@
+"""Пост слота в канале: текст карточки и отложенное обновление подписи.
+
+Во время дропа размеры раскупают пачкой, и каждая продажа раньше сразу
+дёргала edit_message_caption одного и того же поста. CaptionDebouncer
+вместо этого помечает слот «грязным» и ждёт тишины CAPTION_QUIET секунд
+(но не дольше CAPTION_MAX_DELAY с первой пометки). Подпись рендерится из
+актуального слота в момент отправки, так что уходит только последнее
+состояние, а если хэш подписи не изменился — правка не отправляется вовсе.
+"""
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
+
+from bool_shop.cards import caption_hash, slot_card
+from bool_shop.repository import Repository
+
+CAPTION_QUIET = 2.0  # сек без новых изменений перед отправкой
+CAPTION_MAX_DELAY = 10.0  # сек: дольше не копим, даже если продажи идут без пауз
+
+
+class CaptionDebouncer:
+    def __init__(self, bot, repo: Repository, quiet: float = CAPTION_QUIET, max_delay: float = CAPTION_MAX_DELAY):
+        self.bot = bot
+        self.repo = repo
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self._due: dict[int, float] = {}  # slot_id -> когда отправлять, если тихо
+        self._first: dict[int, float] = {}  # slot_id -> первая пометка в текущей пачке
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._sent: dict[int, str] = {}  # slot_id -> хэш подписи, которая сейчас в канале
+        self.requested = 0
+        self.edits = 0
+        self.skipped = 0
+
+    def schedule(self, slot_id: int):
+        """Подпись поста слота устарела — обновить после паузы"""
+        self.requested += 1
+        now = asyncio.get_running_loop().time()
+        self._due[slot_id] = now + self.quiet
+        if slot_id not in self._tasks:
+            self._first[slot_id] = now
+            self._tasks[slot_id] = asyncio.create_task(self._wait_and_flush(slot_id))
+
+    def remember(self, slot_id: int, caption: str):
+        """пост только что опубликован с этой подписью"""
+        self._sent[slot_id] = caption_hash(caption)
+
+    async def _wait_and_flush(self, slot_id: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            deadline = min(self._due[slot_id], self._first[slot_id] + self.max_delay)
+            delay = deadline - loop.time()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        # изменения, пришедшие во время отправки, запустят новую задачу
+        del self._due[slot_id], self._first[slot_id], self._tasks[slot_id]
+        await self.flush(slot_id)
+
+    async def flush(self, slot_id: int):
+        slot = await self.repo.get_slot(slot_id)
+        if not slot or not slot.get("channel_id") or not slot.get("message_id"):
+            return
+
+        card = slot_card(slot)
+        if self._sent.get(slot_id) == card.channel_hash:
+            self.skipped += 1
+            return
+
+        try:
+            await self.bot.edit_message_caption(
+                chat_id=slot["channel_id"],
+                message_id=slot["message_id"],
+                caption=card.channel_caption,
+                reply_markup=card.product_kb
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                print(f"Ошибка при обновлении поста в ТГК: {e}")
+                return
+        except Exception as e:
+            print(f"Ошибка при обновлении поста в ТГК: {e}")
+            return
+        self.edits += 1
+        self._sent[slot_id] = card.channel_hash
+
+    async def close(self):
+        """Остановка бота: отправляем всё накопленное, не дожидаясь паузы"""
+        pending = list(self._tasks)
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._due.clear()
+        self._first.clear()
+        for slot_id in pending:
+            await self.flush(slot_id)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._tasks),
+            "requested": self.requested,
+            "edits": self.edits,
+            "skipped": self.skipped,
+        }
@@ -1,408 +1,840 @@
-import aiosqlite, os
-from aiogram import types
-from datetime import datetime, timedelta
-import aiosqlite
+import asyncio
 import os
+import re
+import time
+from collections.abc import Callable, Iterable
+from contextlib import asynccontextmanager
+from pathlib import Path
 
-DB_NAME = os.path.join(os.path.dirname(__file__), "database.db")
-db: aiosqlite.Connection = None
-OFFSET = 3
-
-
-async def init_db():
-    global db
-    db = await aiosqlite.connect(DB_NAME)
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            tg_id BIGINT PRIMARY KEY NOT NULL,
-            username TEXT NOT NULL,
-            buyer BOOLEAN NOT NULL DEFAULT 0,
-            active_slots INTEGER NOT NULL DEFAULT 0
-        )
-    """)
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS slots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            png TEXT NOT NULL,
-            size TEXT,
-            price TEXT NOT NULL,
-            user_id BIGINT,
-            description TEXT,
-            channel_id BIGINT,
-            message_id BIGINT,
-            FOREIGN KEY (user_id) REFERENCES users (tg_id)
-        )
-    """)
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id BIGINT NOT NULL,
-            username TEXT,
-            slot_id INTEGER NOT NULL,
-            size TEXT,
-            delivery TEXT,
-            address TEXT,
-            proof TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (slot_id) REFERENCES slots (id)
-        )
-    """)
-    await db.commit()
-    print("✅ Таблицы готовы (users, slots, orders)")
-
-
-async def shift_created_at():
-    global db
-    cursor = await db.execute("SELECT id, created_at FROM orders")
-    rows = await cursor.fetchall()
-
-    for order_id, created_at in rows:
-        dt = datetime.fromisoformat(created_at)
-        dt_new = dt + timedelta(hours=OFFSET)
-        await db.execute(
-            "UPDATE orders SET created_at = ? WHERE id = ?",
-            (dt_new.strftime("%Y-%m-%d %H:%M:%S"), order_id)
-        )
-
-    await db.commit()
-
-
-# ================= USERS =================
-
-async def add_user(user):
-    global db
-    await db.execute(
-        "INSERT OR IGNORE INTO users (tg_id, username, buyer, active_slots) VALUES (?, ?, ?, ?)",
-        (user.id, user.username or "unknown", 0, 0)
-    )
-    await db.commit()
-
-
-async def get_users():
-    global db
-    cursor = await db.execute("SELECT tg_id, username FROM users")
-    return await cursor.fetchall()
+import aiosqlite
 
+from bool_shop.cache import SlotCache
+from bool_shop.migrations import migrate
+from bool_shop.models import Notification, Slot, Order, User
+from bool_shop.repository import Repository, PAGE_SIZE, RELEASE_STATUSES, RESERVATION_BATCH, TERMINAL_STATUSES
 
-async def mark_as_buyer(tg_id: int):
-    global db
-    await db.execute("UPDATE users SET buyer = 1 WHERE tg_id = ?", (tg_id,))
-    await db.commit()
-
-async def get_buyers():
-    query = """
-        SELECT u.tg_id, u.username,
-               COUNT(o.id) AS active_slots
-        FROM users u
-        LEFT JOIN orders o 
-            ON u.tg_id = o.user_id
-            AND o.status IN ('paid', 'processing', 'shipped')
-        WHERE u.buyer = 1
-        GROUP BY u.tg_id, u.username
+DB_NAME = os.path.join(os.path.dirname(__file__), "database.db")
+READERS = 4
+BUSY_TIMEOUT_MS = 5000
+WRITE_WINDOW = 0.002  # сек, сколько ждём соседние записи перед COMMIT
+WRITE_BATCH = 256
+SLOT_CACHE_SIZE = 512
+SLOT_CACHE_TTL = 60.0  # сек
+CHECKPOINT_INTERVAL = 5 * 60  # сек
+ARCHIVE_BATCH = 500
+
+
+class WriteQueue:
+    """Актор записи: все мутации выполняются по очереди на одном соединении.
+
+    Операция — корутина ``op(conn)``. Всё, что пришло в очередь за WRITE_WINDOW,
+    выполняется одной транзакцией (каждая операция в своём SAVEPOINT, чтобы
+    ошибка одной не откатывала соседей) и одним fsync на COMMIT.
+    Future каждой операции резолвится только после COMMIT.
     """
-    global db
-    db.row_factory = aiosqlite.Row
-    cursor = await db.execute(query)
-    buyers = await cursor.fetchall()
-    return buyers
-
 
+    def __init__(self, conn: aiosqlite.Connection, window: float = WRITE_WINDOW, batch: int = WRITE_BATCH):
+        self.conn = conn
+        self.window = window
+        self.batch = batch
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, op) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((op, fut))
+        return fut
+
+    async def stop(self):
+        """Дописывает всё, что уже в очереди, и останавливает актор"""
+        if self._task:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                # актор не должен умирать: иначе все следующие write() повиснут навсегда
+                print(f"Ошибка пачки записи: {e}")
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch, error: Exception):
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(error)
+
+    async def _commit(self, batch):
+        db = self.conn
+        done = []
+        try:
+            if db.in_transaction:
+                # прошлой пачке не удалось откатиться — добиваем её транзакцию
+                await db.execute("ROLLBACK")
+            await db.execute("BEGIN IMMEDIATE")
+            for op, fut in batch:
+                if fut.cancelled():
+                    continue
+                await db.execute("SAVEPOINT op")
+                try:
+                    result = await op(db)
+                except Exception as e:
+                    await db.execute("ROLLBACK TO op")
+                    await db.execute("RELEASE op")
+                    done.append((fut, e, False))
+                else:
+                    await db.execute("RELEASE op")
+                    done.append((fut, result, True))
+            await db.execute("COMMIT")
+        except Exception as e:
+            if db.in_transaction:
+                try:
+                    await db.execute("ROLLBACK")
+                except Exception as rollback_error:
+                    print(f"Ошибка ROLLBACK пачки записи: {rollback_error}")
+            self._fail(batch, e)
+            return
+
+        for fut, value, ok in done:
+            if fut.done():
+                continue
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+
+
+class Pool:
+    """Пул соединений: один писатель и READERS читателей (read-only) в режиме WAL.
+
+    Соединения открываются один раз при старте. Чтение — через
+    ``async with pool.reader()``, запись — только через ``pool.write(op)`` /
+    ``pool.execute(sql, params)``, которые ставят операцию в WriteQueue.
+    В WAL чтение идёт параллельно с записью и не ждёт писателя.
+    """
 
-async def increment_slots(tg_id: int, count: int = 1):
-    global db
-    await db.execute(
-            "UPDATE users SET active_slots = active_slots + ? WHERE tg_id = ?",
-            (count, tg_id)
-        )
-    await db.commit()
-
+    def __init__(self, path: str, readers: int = READERS):
+        self.path = path
+        self.size = readers
+        self._writer: aiosqlite.Connection | None = None
+        self._queue: WriteQueue | None = None
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+
+    async def open_writer(self):
+        # isolation_level=None: транзакциями управляет WriteQueue (BEGIN/COMMIT)
+        self._writer = await aiosqlite.connect(self.path, isolation_level=None)
+        await self._writer.execute("PRAGMA journal_mode=WAL")
+        await self._writer.execute("PRAGMA synchronous=FULL")
+        await self._writer.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._connections.append(self._writer)
+
+    async def open_readers(self):
+        """Читатели и актор записи стартуют после того, как писатель создал файл и схему"""
+        uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(uri, uri=True)
+            await conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._connections.append(conn)
+            self._readers.put_nowait(conn)
+        self._queue = WriteQueue(self._writer)
+        self._queue.start()
+
+    @asynccontextmanager
+    async def reader(self):
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    def submit(self, op) -> asyncio.Future:
+        return self._queue.submit(op)
+
+    async def write(self, op):
+        """Выполняет op(conn) в очереди записи и ждёт, пока транзакция закоммитится"""
+        return await self._queue.submit(op)
+
+    async def execute(self, sql: str, params=()):
+        async def op(db):
+            return await db.execute(sql, params)
+        return await self.write(op)
+
+    async def checkpoint(self) -> tuple[int, int, int]:
+        """WAL -> основной файл и обрезка WAL до нуля. Возвращает (busy, страниц в WAL, перенесено).
+
+        Отдельным соединением: внутри транзакции очереди записи checkpoint невозможен.
+        Пока он идёт, писатель ждёт в пределах busy_timeout.
+        """
+        async with aiosqlite.connect(self.path) as conn:
+            await conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            cursor = await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return tuple(await cursor.fetchone())
+
+    async def close(self):
+        if self._queue:
+            await self._queue.stop()
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+
+
+SLOT_COLUMNS = "id, name, png, price, description, user_id, channel_id, message_id"
+SLOT_ROW = Slot.factory("id", "name", "png", "price", "description", "user_id", "channel_id", "message_id")
+SLOT_LIST_ROW = Slot.factory("id", "name", "price", "user_id")
+ORDER_ROW = Order.factory()
+USER_ROW = User.factory()
+NOTIFICATION_ROW = Notification.factory()
+EXPIRED_ORDER_ROW = Order.factory("id", "user_id", "slot_id")
+# WHERE повторяет предикат частичного индекса idx_orders_reserved_until (миграция 14),
+# ORDER BY — его колонки: поиск идёт по индексу, без перебора pending-заказов и сортировки
+EXPIRED_RESERVATIONS_SQL = """
+    SELECT id, user_id, slot_id FROM orders
+    WHERE status = 'pending' AND reserved = 1 AND reserved_until < ?
+    ORDER BY status, reserved, reserved_until
+    LIMIT ?
+"""
+ORDER_LIST_ROW = Order.factory("id", "username", "slot_name", "size", "status", "created_at")
+
+
+async def fetchall(db, factory, sql: str, params=()):
+    """SELECT с row_factory только для этого курсора — состояние соединения не меняется"""
+    cursor = await db.cursor()
+    cursor.row_factory = factory
+    await cursor.execute(sql, params)
+    return await cursor.fetchall()
 
-async def decrement_slots(tg_id: int, count: int = 1):
-    global db
-    await db.execute(
-            "UPDATE users SET active_slots = MAX(active_slots - ?, 0) WHERE tg_id = ?",
-            (count, tg_id)
-        )
-    await db.commit()
 
+async def fetchone(db, factory, sql: str, params=()):
+    cursor = await db.cursor()
+    cursor.row_factory = factory
+    await cursor.execute(sql, params)
+    return await cursor.fetchone()
 
-# ================= SLOTS =================
 
-async def add_slot(name: str, png: str, size: str, price: str, user_id: int, description: str = None):
-    global db
-    await db.execute(
-        "INSERT INTO slots (name, png, size, price, user_id, description) VALUES (?, ?, ?, ?, ?, ?)",
-        (name, png, size, price, user_id, description),
-    )
-    await db.commit()
+def fts_query(text: str) -> str:
+    """'Nike air' -> '"nike"* "air"*': каждое слово как префикс, все слова обязательны"""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text.lower()))
 
 
+class SQLiteRepository(Repository):
+    """Хранилище на SQLite: свой пул соединений и свой кэш слотов на экземпляр,
+    так что две базы можно держать в одном процессе"""
 
-async def update_slot_size(slot_id: int, new_size: str):
-    global db
-    cursor = await db.execute("SELECT size FROM slots WHERE id = ?", (slot_id,))
-    row = await cursor.fetchone()
-    if not row:
-        return False
+    def __init__(self, path: str = DB_NAME, readers: int = READERS):
+        self.path = path
+        self.pool = Pool(path, readers)
+        self.slot_cache = SlotCache(SLOT_CACHE_SIZE, SLOT_CACHE_TTL)
 
-    current_sizes = row[0].split(",") if row[0] else []
-    if new_size in current_sizes:
-        return True
-
-    updated_sizes = ",".join(current_sizes + [new_size]) if current_sizes else new_size
-    await db.execute("UPDATE slots SET size = ? WHERE id = ?", (updated_sizes, slot_id))
-    await db.commit()
-    return True
-
-
-
-async def save_slot_post(slot_id: int, channel_id: int, message_id: int):
-    """сохраняем id канала и сообщения после публикации"""
-    global db
-    await db.execute(
-        "UPDATE slots SET channel_id = ?, message_id = ? WHERE id = ?",
-        (channel_id, message_id, slot_id)
-    )
-    await db.commit()
-
-
-async def get_slots():
-    global db
-    cursor = await db.execute("SELECT id, name, price, user_id FROM slots")
-    rows = await cursor.fetchall()
-    return [
-        {"id": row[0], "name": row[1], "price": row[2], "user_id": row[3]}
-        for row in rows
-    ]
-
-
-
-async def get_slot(slot_id: int):
-    global db
-    cursor = await db.execute(
-        "SELECT id, name, png, size, price, description, user_id, channel_id, message_id FROM slots WHERE id = ?",
-        (slot_id,),
-    )
-    row = await cursor.fetchone()
-    if row:
-        return {
-            "id": row[0],
-            "name": row[1],
-            "png": row[2],
-            "size": row[3],
-            "price": row[4],
-            "description": row[5],
-            "user_id": row[6],
-            "channel_id": row[7],
-            "message_id": row[8],
-        }
-    return None
-
-
-
-
-
-async def update_slot(slot_id: int, field: str, value: str):
-    global db
-    await db.execute(
-        f"UPDATE slots SET {field} = ? WHERE id = ?",
-        (value, slot_id)
-    )
-    await db.commit()
-
-
-
-
-async def get_user_slots(user_id: int):
-    global db
-    cursor = await db.execute(
-        "SELECT id, name, price FROM slots WHERE user_id = ?",
-        (user_id,),
-    )
-    rows = await cursor.fetchall()
-    return [
-        {"id": row[0], "name": row[1], "price": row[2]}
-        for row in rows
-    ]
-
-
-async def delete_slot(slot_id: int):
-    global db
-    await db.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
-    await db.commit()
-
-
-async def reset_slots():
-    global db
-    await db.execute("DELETE FROM slots")
-    await db.execute("DELETE FROM sqlite_sequence WHERE name='slots'")
-    await db.commit()
-    print("♻️ Таблица slots очищена, ID сброшены")
-# ================= ORDERS =================
-
-async def create_order(
-    user_id: int,
-    slot_id: int,
-    username: str | None = None,
-    size: str | None = None,
-    delivery: str | None = None,
-    address: str | None = None,
-):
-    global db
-    cursor = await db.execute(
-        """
-        INSERT INTO orders (user_id, username, slot_id, size, delivery, address, status)
-        VALUES (?, ?, ?, ?, ?, ?, 'pending')
-        """,
-        (user_id, username, slot_id, size, delivery, address),
-    )
-    await increment_slots(user_id)
+    async def open(self):
+        await self.pool.open_writer()
+        version = await migrate(self.pool._writer)
+        await self.pool.open_readers()
+        print(f"✅ Схема БД актуальна (версия {version})")
 
-    await db.commit()
-    return cursor.lastrowid
+    async def close(self):
+        await self.pool.close()
 
+    def cache_stats(self) -> dict:
+        return self.slot_cache.stats()
 
+    async def checkpoint(self):
+        """Фоновая задача: не даёт WAL разрастись между автоматическими checkpoint'ами"""
+        busy, pages, moved = await self.pool.checkpoint()
+        if busy:
+            print(f"⚠ WAL checkpoint не завершён: читатели заняты, перенесено {moved} из {pages} страниц")
 
+    # ================= USERS =================
 
+    async def add_user(self, user):
+        await self.pool.execute(
+            "INSERT OR IGNORE INTO users (tg_id, username, buyer, active_slots) VALUES (?, ?, ?, ?)",
+            (user.id, user.username or "unknown", 0, 0)
+        )
 
-async def get_users_with_orders():
-    query = """
-        SELECT u.tg_id, u.username, u.buyer,
-               COUNT(o.id) as active_slots
-        FROM users u
-        LEFT JOIN orders o
-            ON u.tg_id = o.user_id
-           AND o.status IN ('paid', 'processing', 'shipped')
-        GROUP BY u.tg_id, u.username, u.buyer
-    """
-    global db
-    db.row_factory = aiosqlite.Row
-    cursor = await db.execute(query)
-    return await cursor.fetchall()
+    async def get_users(self):
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT tg_id, username FROM users")
+            return await cursor.fetchall()
+
+    async def mark_as_buyer(self, tg_id: int):
+        await self.pool.execute("UPDATE users SET buyer = 1 WHERE tg_id = ?", (tg_id,))
+
+    # ================= SLOTS =================
+
+    async def add_slot(self, name: str, png: str, sizes: list[str], price: int, user_id: int, description: str = None):
+        async def op(db):
+            cursor = await db.execute(
+                "INSERT INTO slots (name, png, price, user_id, description) VALUES (?, ?, ?, ?, ?)",
+                (name, png, price, user_id, description),
+            )
+            await self._insert_sizes(db, cursor.lastrowid, sizes)
+            return cursor.lastrowid
+
+        slot_id = await self.pool.write(op)
+        self.slot_cache.invalidate(slot_id, "all")
+        return slot_id
+
+    async def _insert_sizes(self, db, slot_id: int, sizes: list[str]):
+        """повторяющийся размер = ещё одна единица на складе"""
+        await db.executemany(
+            """
+            INSERT INTO slot_sizes (slot_id, size, qty) VALUES (?, ?, 1)
+            ON CONFLICT (slot_id, size) DO UPDATE SET qty = qty + 1
+            """,
+            [(slot_id, size) for size in sizes if size],
+        )
 
+    async def set_slot_sizes(self, slot_id: int, sizes: list[str]):
+        """полностью заменяет список размеров слота"""
+        async def op(db):
+            await db.execute("DELETE FROM slot_sizes WHERE slot_id = ?", (slot_id,))
+            await self._insert_sizes(db, slot_id, sizes)
+
+        await self.pool.write(op)
+        self.slot_cache.invalidate(slot_id)
+
+    async def update_slot_size(self, slot_id: int, new_size: str):
+        """добавляет размер в наличие; False, если слота нет"""
+        cursor = await self.pool.execute(
+            """
+            INSERT INTO slot_sizes (slot_id, size, qty)
+            SELECT id, ?, 1 FROM slots WHERE id = ?
+            ON CONFLICT (slot_id, size) DO UPDATE SET qty = MAX(qty, 1)
+            """,
+            (new_size, slot_id)
+        )
+        self.slot_cache.invalidate(slot_id)
+        return cursor.rowcount > 0
+
+    async def reserve_size(self, slot_id: int, size: str) -> bool:
+        """атомарно списывает одну единицу размера; False, если его уже нет"""
+        cursor = await self.pool.execute(
+            "UPDATE slot_sizes SET qty = qty - 1 WHERE slot_id = ? AND size = ? AND qty > 0",
+            (slot_id, size)
+        )
+        if cursor.rowcount == 1:
+            self.slot_cache.invalidate(slot_id)
+            return True
+        return False
 
-async def get_order_user(order_id: int):
-    global db
-    cursor = await db.execute(
+    async def save_slot_post(self, slot_id: int, channel_id: int, message_id: int):
+        """сохраняем id канала и сообщения после публикации"""
+        await self.pool.execute(
+            "UPDATE slots SET channel_id = ?, message_id = ? WHERE id = ?",
+            (channel_id, message_id, slot_id)
+        )
+        self.slot_cache.invalidate(slot_id)
+
+    async def get_slots(self):
+        slots = self.slot_cache.get("all", default=None)
+        if slots is not None:
+            return slots
+
+        version = self.slot_cache.version("all")
+        async with self.pool.reader() as db:
+            slots = await fetchall(db, SLOT_LIST_ROW, "SELECT id, name, price, user_id FROM slots ORDER BY id")
+        self.slot_cache.put("all", version, slots)
+        return slots
+
+    async def get_slot(self, slot_id: int):
+        """read-through: горячий слот отдаётся из памяти без запроса к БД"""
+        slot = self.slot_cache.get(slot_id, default=False)
+        if slot is not False:
+            return slot
+
+        version = self.slot_cache.version(slot_id)
+        slot = await self._load_slot(slot_id)
+        self.slot_cache.put(slot_id, version, slot)
+        return slot
+
+    async def _load_slot(self, slot_id: int):
+        async with self.pool.reader() as db:
+            slot = await fetchone(db, SLOT_ROW, f"SELECT {SLOT_COLUMNS} FROM slots WHERE id = ?", (slot_id,))
+            if slot:
+                cursor = await db.execute(
+                    "SELECT size FROM slot_sizes WHERE slot_id = ? AND qty > 0 ORDER BY rowid",
+                    (slot_id,),
+                )
+                slot.sizes = [r[0] for r in await cursor.fetchall()]
+        return slot
+
+    async def update_slot(self, slot_id: int, field: str, value: str):
+        await self.pool.execute(
+            f"UPDATE slots SET {field} = ? WHERE id = ?",
+            (value, slot_id)
+        )
+        self.slot_cache.invalidate(slot_id, "all")
+
+    async def get_user_slots(self, user_id: int):
+        async with self.pool.reader() as db:
+            return await fetchall(
+                db, SLOT_LIST_ROW,
+                "SELECT id, name, price, user_id FROM slots WHERE user_id = ? ORDER BY id",
+                (user_id,),
+            )
+
+    async def delete_slot(self, slot_id: int):
+        await self.pool.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+        self.slot_cache.invalidate(slot_id, "all")
+
+    async def reset_slots(self):
+        async def op(db):
+            await db.execute("DELETE FROM slots")
+            await db.execute("DELETE FROM sqlite_sequence WHERE name='slots'")
+
+        await self.pool.write(op)
+        self.slot_cache.invalidate()
+        print("♻️ Таблица slots очищена, ID сброшены")
+
+    # ================= ORDERS =================
+
+    async def create_order(
+        self,
+        user_id: int,
+        slot_id: int,
+        username: str | None = None,
+        size: str | None = None,
+        delivery: str | None = None,
+        address: str | None = None,
+        idempotency_key: str | None = None,
+        reserve_for: int | None = None,
+    ):
+        async def op(db):
+            if idempotency_key is not None:
+                # повтор: заказ с этим ключом уже есть. Писатель один, так что
+                # между проверкой и INSERT никто не вклинится; уникальный индекс — страховка
+                cursor = await db.execute("SELECT id FROM orders WHERE idempotency_key = ?", (idempotency_key,))
+                row = await cursor.fetchone()
+                if row:
+                    return row[0]
+            reserved_until = None
+            if reserve_for is not None:
+                cursor = await db.execute(
+                    "UPDATE slot_sizes SET qty = qty - 1 WHERE slot_id = ? AND size = ? AND qty > 0",
+                    (slot_id, size)
+                )
+                if cursor.rowcount == 0:
+                    return None
+                reserved_until = int(time.time()) + reserve_for
+            cursor = await db.execute(
+                """
+                INSERT INTO orders (user_id, username, slot_id, size, delivery, address, status, idempotency_key,
+                                    reserved, reserved_until, price)
+                VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, (SELECT price FROM slots WHERE id = ?))
+                """,
+                (user_id, username, slot_id, size, delivery, address, idempotency_key,
+                 int(reserve_for is not None), reserved_until, slot_id),
+            )
+            return cursor.lastrowid
+
+        order_id = await self.pool.write(op)
+        if reserve_for is not None:
+            self.slot_cache.invalidate(slot_id)
+        return order_id
+
+    async def get_order_user(self, order_id: int):
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                """
+                SELECT o.user_id, s.name
+                FROM orders o
+                JOIN slots s ON o.slot_id = s.id
+                WHERE o.id = ?
+                """,
+                (order_id,)
+            )
+            return await cursor.fetchone()
+
+    async def _update_order(self, sql: str, params, notify: Iterable[Notification],
+                            release: int | None = None) -> bool:
+        """UPDATE заказа и уведомления о нём — одной транзакцией.
+
+        WHERE в sql пропускает строку, в которой уже записаны те же значения:
+        повтор операции ничего не пишет и уведомлений не шлёт. release — id
+        заказа, чья бронь возвращается на склад, если UPDATE что-то изменил.
+        Возвращает, изменился ли заказ.
         """
-        SELECT o.user_id, s.name
-        FROM orders o
-        JOIN slots s ON o.slot_id = s.id
-        WHERE o.id = ?
-        """,
-        (order_id,)
-    )
-    return await cursor.fetchone()
-
+        notify = list(notify)
+
+        async def op(db):
+            cursor = await db.execute(sql, params)
+            if not cursor.rowcount:
+                return False, set()
+            slot_ids = await self._release_reservations(db, [release]) if release is not None else set()
+            await self._insert_outbox(db, notify)
+            return True, slot_ids
+
+        changed, slot_ids = await self.pool.write(op)
+        if slot_ids:
+            self.slot_cache.invalidate(*slot_ids)
+        if changed and notify:
+            self.outbox_ready.set()
+        return changed
+
+    @staticmethod
+    async def _release_reservations(db, order_ids: list[int]) -> set[int]:
+        """Возвращает брони заказов на склад одним INSERT на пачку. Возвращает id слотов"""
+        marks = ", ".join("?" * len(order_ids))
+        cursor = await db.execute(
+            f"SELECT DISTINCT slot_id FROM orders WHERE id IN ({marks}) AND reserved = 1", order_ids
+        )
+        slot_ids = {row[0] for row in await cursor.fetchall()}
+        if not slot_ids:
+            return slot_ids
+        # удалённому слоту возвращать нечего
+        await db.execute(
+            f"""
+            INSERT INTO slot_sizes (slot_id, size, qty)
+            SELECT slot_id, size, COUNT(*) FROM orders
+            WHERE id IN ({marks}) AND reserved = 1 AND slot_id IN (SELECT id FROM slots)
+            GROUP BY slot_id, size
+            ON CONFLICT (slot_id, size) DO UPDATE SET qty = qty + excluded.qty
+            """,
+            order_ids
+        )
+        await db.execute(
+            f"UPDATE orders SET reserved = 0, reserved_until = NULL WHERE id IN ({marks}) AND reserved = 1", order_ids
+        )
+        return slot_ids
+
+    async def update_order_address(self, order_id: int, address: str, status: str | None = None,
+                                   notify: Iterable[Notification] = ()):
+        if status:
+            return await self._update_order(
+                "UPDATE orders SET address = ?, status = ? WHERE id = ? AND (address IS NOT ? OR status IS NOT ?)",
+                (address, status, order_id, address, status), notify
+            )
+        return await self._update_order(
+            "UPDATE orders SET address = ? WHERE id = ? AND address IS NOT ?", (address, order_id, address), notify
+        )
 
-async def update_order_address(order_id: int, address: str):
-    global db
-    await db.execute("UPDATE orders SET address = ? WHERE id = ?", (address, order_id))
-    await db.commit()
+    async def update_order_delivery(self, order_id: int, delivery: str, status: str | None = None,
+                                    notify: Iterable[Notification] = ()):
+        if status:
+            return await self._update_order(
+                "UPDATE orders SET delivery = ?, status = ? WHERE id = ? AND (delivery IS NOT ? OR status IS NOT ?)",
+                (delivery, status, order_id, delivery, status), notify
+            )
+        return await self._update_order(
+            "UPDATE orders SET delivery = ? WHERE id = ? AND delivery IS NOT ?", (delivery, order_id, delivery), notify
+        )
 
-async def get_all_users():
-    global db
-    cursor = await db.execute(
-        "SELECT tg_id, username, buyer, active_slots FROM users"
-    )
-    rows = await cursor.fetchall()
-    return [
-        {
-            "tg_id": row[0],
-            "username": row[1],
-            "buyer": bool(row[2]),
-            "active_slots": row[3],
-        }
-        for row in rows
-    ]
+    async def decline_order(self, order_id: int, notify: Iterable[Notification] = ()):
+        """админ отклонил заказ: сбрасываем доставку и адрес"""
+        return await self._update_order(
+            "UPDATE orders SET delivery = NULL, address = NULL, status = 'declined'"
+            " WHERE id = ? AND status IS NOT 'declined'",
+            (order_id,), notify, release=order_id
+        )
 
+    async def get_all_users(self):
+        async with self.pool.reader() as db:
+            return await fetchall(db, USER_ROW, "SELECT tg_id, username, buyer, active_slots FROM users")
 
+    async def update_order_status(self, order_id: int, status: str, notify: Iterable[Notification] = ()):
+        return await self._update_order(
+            "UPDATE orders SET status = ? WHERE id = ? AND status IS NOT ?", (status, order_id, status), notify,
+            release=order_id if status in RELEASE_STATUSES else None
+        )
 
+    async def add_order_proof(self, order_id: int, proof_file_id: str, notify: Iterable[Notification] = ()):
+        return await self._update_order(
+            "UPDATE orders SET proof = ?, reserved_until = NULL WHERE id = ? AND status = 'pending' AND proof IS NOT ?",
+            (proof_file_id, order_id, proof_file_id), notify
+        )
 
-async def get_all_orders_history():
-    global db
-    cursor = await db.execute(
+    async def expire_reservations(self, now: int, limit: int = RESERVATION_BATCH,
+                                  notify: Callable[[Order], Notification] | None = None) -> set[int]:
+        async def op(db):
+            orders = await fetchall(db, EXPIRED_ORDER_ROW, EXPIRED_RESERVATIONS_SQL, (now, limit))
+            if not orders:
+                return set()
+            ids = [order.id for order in orders]
+            slot_ids = await self._release_reservations(db, ids)
+            marks = ", ".join("?" * len(ids))
+            await db.execute(f"UPDATE orders SET status = 'expired' WHERE id IN ({marks})", ids)
+            if notify:
+                await self._insert_outbox(db, [notify(order) for order in orders])
+            return slot_ids
+
+        slot_ids = await self.pool.write(op)
+        if slot_ids:
+            self.slot_cache.invalidate(*slot_ids)
+            if notify:
+                self.outbox_ready.set()
+        return slot_ids
+
+    async def get_user_orders(self, user_id: int):
+        """заказы пользователя вместе с архивными"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                """
+                SELECT id, slot_id, size, address, status FROM (
+                    SELECT id, slot_id, size, address, status, created_at FROM orders WHERE user_id = ?
+                    UNION ALL
+                    SELECT id, slot_id, size, address, status, created_at FROM orders_archive WHERE user_id = ?
+                )
+                ORDER BY created_at DESC
+                """,
+                (user_id, user_id)
+            )
+            return await cursor.fetchall()
+
+    async def get_order(self, order_id: int) -> Order | None:
+        query = """
+            SELECT o.id, o.user_id, o.username, o.size, o.delivery, o.address, o.status,
+                   o.proof, o.slot_id, s.name AS slot_name, o.price, o.created_at, o.reserved
+            FROM orders o
+            LEFT JOIN slots s ON o.slot_id = s.id
+            WHERE o.id = ?
         """
-        SELECT o.id, u.username, s.name, o.size, o.status, o.created_at
-        FROM orders o
-        JOIN users u ON o.user_id = u.tg_id
-        JOIN slots s ON o.slot_id = s.id
-        ORDER BY o.created_at DESC
+        async with self.pool.reader() as db:
+            return await fetchone(db, ORDER_ROW, query, (order_id,))
+
+    # ================= OUTBOX =================
+
+    @staticmethod
+    async def _insert_outbox(db, notify: list[Notification]):
+        if notify:
+            await db.executemany(
+                "INSERT INTO outbox (chat_id, text, photo, reply_markup) VALUES (?, ?, ?, ?)",
+                [(n.chat_id, n.text, n.photo, n.reply_markup) for n in notify],
+            )
+
+    async def get_outbox(self, now: float, limit: int) -> list[Notification]:
+        async with self.pool.reader() as db:
+            return await fetchall(
+                db, NOTIFICATION_ROW,
+                """
+                SELECT id, chat_id, text, photo, reply_markup, attempts, next_at FROM outbox AS o
+                WHERE next_at <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM outbox AS e
+                      WHERE e.chat_id = o.chat_id AND e.id < o.id AND e.next_at > ?
+                  )
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now, now, limit),
+            )
+
+    async def ack_outbox(self, ids: list[int]):
+        if not ids:
+            return
+
+        async def op(db):
+            await db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+        await self.pool.write(op)
+
+    async def retry_outbox(self, retries: list[tuple[int, float, bool]]):
+        if not retries:
+            return
+
+        async def op(db):
+            await db.executemany(
+                "UPDATE outbox SET next_at = ?, attempts = attempts + ? WHERE id = ?",
+                [(next_at, int(failed), i) for i, next_at, failed in retries],
+            )
+
+        await self.pool.write(op)
+
+    # ================= REPORTS =================
+    # Листинги для админских отчётов: keyset-пагинация вместо fetchall всей таблицы.
+    # after — ключ последней строки текущей страницы (следующая страница),
+    # before — ключ первой строки (предыдущая). Возвращают (rows, has_more), где
+    # has_more — есть ли ещё строки в направлении листания.
+
+    async def get_orders_page(self, active: bool = False, after: tuple | None = None,
+                              before: tuple | None = None, limit: int = PAGE_SIZE):
+        """Заказы от новых к старым, keyset по (created_at, id).
+
+        Активные заказы живут только в orders; полная история — ещё и orders_archive.
+        Каждая таблица отдаёт не больше limit + 1 строк по своему индексу,
+        а итоговая сортировка идёт уже по этим двум кусочкам.
         """
-    )
-    return await cursor.fetchall()
-
-
-
-async def update_order_status(order_id: int, status: str):
-    global db
-    await db.execute(
-        "UPDATE orders SET status = ? WHERE id = ?",
-        (status, order_id)
-    )
-    await db.commit()
-
-
-async def add_order_proof(order_id: int, proof_file_id: str):
-    global db
-    await db.execute(
-        "UPDATE orders SET proof = ? WHERE id = ?",
-        (proof_file_id, order_id)
-    )
-    await db.commit()
-
-
-async def get_user_orders(user_id: int):
-    global db
-    cursor = await db.execute(
-        "SELECT id, slot_id, size, address, status FROM orders WHERE user_id = ? ORDER BY created_at DESC",
-        (user_id,)
-    )
-    return await cursor.fetchall()
-
-
-
-async def get_all_orders():
-    global db
-    cursor = await db.execute(
+        where, params, order = [], [], "DESC"
+        if active:
+            where.append("o.status IN ('paid', 'processing', 'shipped')")
+        if after:
+            where.append("(o.created_at, o.id) < (?, ?)")
+            params += after
+        elif before:
+            where.append("(o.created_at, o.id) > (?, ?)")
+            params += before
+            order = "ASC"
+
+        def part(table):
+            return f"""
+                SELECT * FROM (
+                    SELECT o.id, u.username, s.name, o.size, o.status, o.created_at
+                    FROM {table} o
+                    JOIN users u ON o.user_id = u.tg_id
+                    JOIN slots s ON o.slot_id = s.id
+                    {"WHERE " + " AND ".join(where) if where else ""}
+                    ORDER BY o.created_at {order}, o.id {order}
+                    LIMIT ?
+                )
+            """
+
+        if active:
+            query, args = part("orders"), (*params, limit + 1)
+        else:
+            query = f"""
+                {part("orders")}
+                UNION ALL
+                {part("orders_archive")}
+                ORDER BY 6 {order}, 1 {order}
+                LIMIT ?
+            """
+            args = (*params, limit + 1, *params, limit + 1, limit + 1)
+
+        async with self.pool.reader() as db:
+            rows = await fetchall(db, ORDER_LIST_ROW, query, args)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+        return rows, has_more
+
+    async def get_users_page(self, buyers_only: bool = False, after: int | None = None,
+                             before: int | None = None, limit: int = PAGE_SIZE):
+        """Пользователи со счётчиком активных заказов (его ведут триггеры), keyset по tg_id"""
+        where, params, order = [], [], "ASC"
+        if buyers_only:
+            where.append("u.buyer = 1")
+        if after is not None:
+            where.append("u.tg_id > ?")
+            params.append(after)
+        elif before is not None:
+            where.append("u.tg_id < ?")
+            params.append(before)
+            order = "DESC"
+
+        query = f"""
+            SELECT u.tg_id, u.username, u.buyer, u.active_slots
+            FROM users u
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY u.tg_id {order}
+            LIMIT ?
         """
-        SELECT o.id, u.username, s.name, o.status, o.created_at
-        FROM orders o
-        JOIN users u ON o.user_id = u.tg_id
-        JOIN slots s ON o.slot_id = s.id
-        WHERE o.status IN ('paid', 'processing', 'shipped')
-        ORDER BY o.created_at DESC
+        async with self.pool.reader() as db:
+            rows = await fetchall(db, USER_ROW, query, (*params, limit + 1))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return rows, has_more
+
+    async def get_revenue(self, since: int = 0):
+        """(число выполненных заказов, выручка в копейках) с момента since (UTC epoch), включая архив"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                """
+                SELECT COUNT(*), COALESCE(SUM(price), 0)
+                FROM (
+                    SELECT price FROM orders WHERE status = 'completed' AND created_at >= ?
+                    UNION ALL
+                    SELECT price FROM orders_archive WHERE status = 'completed' AND created_at >= ?
+                )
+                """,
+                (since, since)
+            )
+            return await cursor.fetchone()
+
+    async def get_price_range(self):
+        """(min, max) цены среди слотов в копейках или (None, None)"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT MIN(price), MAX(price) FROM slots")
+            return await cursor.fetchone()
+
+    # ================= SEARCH =================
+
+    async def search_slots(self, text: str, offset: int = 0, limit: int = PAGE_SIZE):
+        """Поиск по названию и хэштегам через FTS5. Возвращает (id слотов по релевантности, всего найдено)"""
+        query = fts_query(text)
+        if not query:
+            return [], 0
+
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM slots_fts WHERE slots_fts MATCH ?", (query,))
+            (total,) = await cursor.fetchone()
+            if not total:
+                return [], 0
+            # название весит больше хэштегов
+            cursor = await db.execute(
+                """
+                SELECT rowid FROM slots_fts
+                WHERE slots_fts MATCH ?
+                ORDER BY bm25(slots_fts, 10.0, 1.0)
+                LIMIT ? OFFSET ?
+                """,
+                (query, limit, offset)
+            )
+            ids = [row[0] for row in await cursor.fetchall()]
+        return ids, total
+
+    # ================= ARCHIVE =================
+
+    async def archive_orders(self, older_than: int, batch_size: int = ARCHIVE_BATCH) -> int:
+        """Переносит завершённые заказы старше older_than секунд в orders_archive.
+
+        Каждая пачка — отдельная операция в очереди записи, так что перенос
+        не держит писателя надолго. Возвращает число перенесённых заказов.
         """
-    )
-    return await cursor.fetchall()
-
-
-async def get_order(order_id: int) -> dict | None:
-    query = """
-        SELECT o.id, o.user_id, o.username, o.size, o.delivery, o.address, o.status,
-               o.proof, o.slot_id, s.name AS slot_name, s.price
-        FROM orders o
-        JOIN slots s ON o.slot_id = s.id
-        WHERE o.id = ?
-    """
-    global db
-    cursor = await db.execute(query, (order_id,))
-    row = await cursor.fetchone()
-    if row:
-        return {
-            "id": row[0],
-            "user_id": row[1],
-            "username": row[2],
-            "size": row[3],
-            "delivery": row[4],
-            "address": row[5],
-            "status": row[6],
-            "proof": row[7],
-            "slot_id": row[8],
-            "slot_name": row[9],
-            "price": row[10]
-        }
-    return None
-
+        cutoff = int(time.time()) - older_than
+        statuses = ", ".join("?" * len(TERMINAL_STATUSES))
+
+        async def op(db):
+            cursor = await db.execute(
+                f"""
+                SELECT id FROM orders
+                WHERE status IN ({statuses}) AND created_at < ?
+                ORDER BY created_at
+                LIMIT ?
+                """,
+                (*TERMINAL_STATUSES, cutoff, batch_size)
+            )
+            ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                return 0
+
+            marks = ", ".join("?" * len(ids))
+            await db.execute(
+                f"""
+                INSERT INTO orders_archive (id, user_id, username, slot_id, size, delivery, address, proof, status,
+                                            created_at, price)
+                SELECT id, user_id, username, slot_id, size, delivery, address, proof, status, created_at, price
+                FROM orders WHERE id IN ({marks})
+                """,
+                ids
+            )
+            await db.execute(f"DELETE FROM orders WHERE id IN ({marks})", ids)
+            return len(ids)
+
+        total = 0
+        while True:
+            moved = await self.pool.write(op)
+            total += moved
+            if moved < batch_size:
+                return total
@@ -0,0 +1,172 @@
+"""FSM-хранилище aiogram поверх таблицы fsm_state.
+
+Состояния живут в LRU-кэше процесса (не больше FSM_CACHE_SIZE ключей);
+с диска ключ читается только при первом обращении после старта или
+вытеснения. Запись — write-back: set_state / set_data меняют кэш и помечают
+ключ грязным, а фоновая задача раз в FSM_FLUSH_INTERVAL пишет все грязные
+ключи одной операцией в очередь записи пула. Грязные ключи не вытесняются,
+поэтому кэш всегда не старее диска.
+
+Состояние, которое не менялось FSM_TTL секунд, считается брошенным:
+оно не отдаётся при чтении, а sweep() раз в FSM_SWEEP_INTERVAL
+(задачей планировщика) вычищает его из таблицы.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+FSM_CACHE_SIZE = 10_000
+FSM_TTL = 3 * 86400  # сек: брошенное оформление заказа живёт три дня
+FSM_FLUSH_INTERVAL = 0.5  # сек
+FSM_SWEEP_INTERVAL = 3600  # сек
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, repo, cache_size: int = FSM_CACHE_SIZE, ttl: int = FSM_TTL,
+                 flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.pool = repo.pool
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._cache: OrderedDict[str, list] = OrderedDict()  # key -> [state, data, updated_at]
+        self._dirty: set[str] = set()
+        self._in_flight: Counter[str] = Counter()  # уже не грязные, но ещё не закоммичены (число flush'ей)
+        self._flusher: asyncio.Task | None = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny,
+        ))
+
+    async def _load(self, k: str) -> list:
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT state, data, updated_at FROM fsm_state WHERE key = ?", (k,))
+            row = await cursor.fetchone()
+        if row is None:
+            return [None, {}, 0]
+        return [row[0], json.loads(row[1]), row[2]]
+
+    async def _entry(self, key: StorageKey) -> list:
+        k = self._key(key)
+        entry = self._cache.get(k)
+        if entry is None:
+            loaded = await self._load(k)
+            # пока читали, ключ мог появиться в кэше — берём то, что там
+            entry = self._cache.setdefault(k, loaded)
+            self._evict(keep=k)
+        else:
+            self._cache.move_to_end(k)
+
+        if entry[2] and entry[2] < time.time() - self.ttl:
+            entry[:] = [None, {}, int(time.time())]
+            self._mark(k)
+        return entry
+
+    def _mark(self, k: str):
+        self._dirty.add(k)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+
+    def _evict(self, keep: str | None):
+        """keep — ключ, который сейчас читают или пишут: его вытеснять нельзя"""
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        victims = []
+        for k in self._cache:
+            if len(victims) >= excess:
+                break
+            if k != keep and k not in self._dirty and k not in self._in_flight:
+                victims.append(k)
+        for k in victims:
+            del self._cache[k]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        entry[2] = int(time.time())
+        self._mark(self._key(key))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._entry(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry[1] = dict(data)
+        entry[2] = int(time.time())
+        self._mark(self._key(key))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._entry(key))[1].copy()
+
+    async def flush(self):
+        """Пишет все грязные ключи одной операцией"""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        # пока запись не закоммичена, на диске старая версия: вытеснять такие ключи нельзя
+        self._in_flight += Counter(keys)
+        upserts, deletes = [], []
+        for k in keys:
+            state, data, updated_at = self._cache[k]
+            if state is None and not data:
+                deletes.append((k,))
+            else:
+                upserts.append((k, state, json.dumps(data, ensure_ascii=False), updated_at))
+
+        async def op(db):
+            if upserts:
+                await db.executemany(
+                    """
+                    INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    upserts,
+                )
+            if deletes:
+                await db.executemany("DELETE FROM fsm_state WHERE key = ?", deletes)
+
+        try:
+            await self.pool.write(op)
+        except BaseException:
+            # в том числе отмена при остановке: ключи снова грязные, допишем в close()
+            self._dirty |= keys
+            raise
+        finally:
+            self._in_flight -= Counter(keys)
+        # записанные ключи снова можно вытеснять
+        self._evict(keep=None)
+
+    async def sweep(self) -> int:
+        """Фоновая задача: удаляет брошенные состояния из таблицы и из кэша"""
+        cutoff = int(time.time()) - self.ttl
+        cursor = await self.pool.execute("DELETE FROM fsm_state WHERE updated_at < ?", (cutoff,))
+        for k in [k for k, entry in self._cache.items() if entry[2] and entry[2] < cutoff
+                  and k not in self._dirty and k not in self._in_flight]:
+            del self._cache[k]
+        if cursor.rowcount:
+            print(f"🧹 Удалено брошенных FSM-состояний: {cursor.rowcount}")
+        return cursor.rowcount
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Ошибка записи FSM-состояний: {e}")
+
+    async def close(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            # дожидаемся отмены: прерванный flush вернёт свои ключи в грязные
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
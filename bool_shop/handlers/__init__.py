@@ -0,0 +1,13 @@
+from aiogram import Dispatcher
+
+from bool_shop.handlers import admin_handlers, order_handlers, report_handlers, search_handlers, user_handlers
+
+
+def setup_routers(dp: Dispatcher):
+    # порядок важен: catch-all callback_query в user_handlers забирает
+    # всё, что не разобрали роутеры выше него
+    dp.include_router(report_handlers.router)
+    dp.include_router(search_handlers.router)
+    dp.include_router(user_handlers.router)
+    dp.include_router(order_handlers.router)
+    dp.include_router(admin_handlers.router)
@@ -1,12 +1,19 @@
+import time
+
 from aiogram import  Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
-from bool_shop.db import add_slot, get_slots, delete_slot, reset_slots, get_all_orders, \
-    get_slot, update_slot, update_slot_size, get_all_orders_history
+from bool_shop.repository import Repository
+from bool_shop.cards import cards, slot_card
+from bool_shop.channel import CaptionDebouncer
+from bool_shop.db import SQLiteRepository
 from bool_shop.states import EditSlotForm, AddSlot, AdminFSM
-import bool_shop.keyboards as kb
+from bool_shop.money import parse_price, format_price
+from bool_shop.backup import make_backup, list_backups
+from bool_shop.throttling import RateLimiter
+from bool_shop.scheduler import Scheduler
 from bool_shop.bot_token import ADMINS, CHANNEL_ID
 
 router = Router()
@@ -33,9 +40,15 @@ async def slot_name(message: Message, state: FSMContext):
 
 @router.message(AddSlot.waiting_price)
 async def slot_price(message: Message, state: FSMContext):
-    await state.update_data(price=message.text)
+    try:
+        price = parse_price(message.text or "")
+    except ValueError:
+        return await message.answer("⚠ Введи цену числом, например: 1500 или 1499.90")
+
+    await state.update_data(price=price)
     await message.answer("Отправь фото товара:")
     await state.set_state(AddSlot.waiting_png)
+    return None
 
 
 @router.message(AddSlot.waiting_png, F.photo)
@@ -51,35 +64,12 @@ async def slot_png(message: Message, state: FSMContext):
 @router.message(AddSlot.waiting_sizes)
 async def slot_sizes(message: Message, state: FSMContext):
     sizes_text = message.text
-    sizes_list = [s.strip() for s in sizes_text.split(",")]
-    await state.update_data(size=",".join(sizes_list))
+    sizes_list = [s.strip() for s in sizes_text.split(",") if s.strip()]
+    await state.update_data(sizes=sizes_list)
 
     await message.answer("Введи хэштеги товара:")
     await state.set_state(AddSlot.waiting_description)
 
-@router.message(Command("all_orders"))
-async def all_orders(message: Message):
-    if message.from_user.id not in ADMINS:
-        return await message.answer("⛔ Нет доступа.")
-
-    orders = await get_all_orders_history()
-    if not orders:
-        return await message.answer("📭 История заказов пуста.")
-
-    text = "📜 История заказов:\n\n"
-    for o in orders:
-        text += (
-            f"📦 Заказ #{o[0]}\n"
-            f"👤 @{o[1] or '—'}\n"
-            f"📌 {o[2]} — {o[3] or '—'}\n"
-            f"📊 Статус: {o[4]}\n"
-            f"🕒 {o[5]}\n\n"
-        )
-
-    await message.answer(text)
-    return None
-
-
 @router.message(F.from_user.id.in_(ADMINS), Command("addsize"))
 async def cmd_addsize(message: Message, state: FSMContext):
     try:
@@ -94,62 +84,41 @@ async def cmd_addsize(message: Message, state: FSMContext):
 
 
 @router.message(AdminFSM.waiting_for_new_size, F.from_user.id.in_(ADMINS))
-async def process_new_size(message: Message, state: FSMContext):
+async def process_new_size(message: Message, state: FSMContext, repo: Repository, captions: CaptionDebouncer):
     new_size = message.text.strip()
     data = await state.get_data()
     slot_id = data["slot_id"]
 
-    success = await update_slot_size(slot_id, new_size)
+    success = await repo.update_slot_size(slot_id, new_size)
     if not success:
         await message.answer("❌ Слот не найден")
         return await state.clear()
 
-    slot = await get_slot(slot_id)
-
     await message.answer(f"✅ Размер {new_size} добавлен в слот #{slot_id}")
-
-    if slot.get("channel_id") and slot.get("message_id"):
-        caption = (
-            f"🔥 {slot['name']}\n"
-            f"Размеры: {slot['size']}\n"
-            f"Цена: {slot['price']}₽\n"
-            f"{slot['description']}\n\n"
-            f"👉 Жми кнопку ниже, чтобы заказать!"
-        )
-
-        try:
-            await message.bot.edit_message_caption(
-                chat_id=slot["channel_id"],
-                message_id=slot["message_id"],
-                caption=caption,
-                reply_markup=kb.product_button(slot_id)
-            )
-            await message.answer("📢 Пост в канале обновлён ✅")
-        except Exception as e:
-            await message.answer(f"⚠ Не удалось обновить пост: {e}")
+    captions.schedule(slot_id)  # пост в канале обновится после короткой паузы
 
     await state.clear()
     return None
 
 
 @router.message(AddSlot.waiting_description)
-async def slot_description(message: Message, state: FSMContext):
+async def slot_description(message: Message, state: FSMContext, repo: Repository):
     await state.update_data(description=message.text)
 
     data = await state.get_data()
-    await add_slot(
+    await repo.add_slot(
         name=data["name"],
         png=data["png"],
         price=data["price"],
-        size=data["size"],
+        sizes=data["sizes"],
         description=data["description"],
         user_id=None
     )
 
     await message.answer(
         f"✅ Товар {data['name']} добавлен!\n"
-        f"Размеры: {data['size']}\n"
-        f"Цена: {data['price']}₽\n"
+        f"Размеры: {','.join(data['sizes'])}\n"
+        f"Цена: {format_price(data['price'])}₽\n"
         f"{data['description']}",
         parse_mode="HTML"
     )
@@ -158,7 +127,7 @@ async def slot_description(message: Message, state: FSMContext):
 
 
 @router.message(Command("delete_slot"))
-async def cmd_delete_slot(message: Message):
+async def cmd_delete_slot(message: Message, repo: Repository):
     if message.from_user.id not in ADMINS:
         return await message.answer("⛔ Нет доступа.")
 
@@ -167,7 +136,7 @@ async def cmd_delete_slot(message: Message):
     except (IndexError, ValueError):
         return await message.answer("⚠ Укажи ID слота: /delete_slot <id>")
 
-    slot = await get_slot(slot_id)
+    slot = await repo.get_slot(slot_id)
     if not slot:
         return await message.answer(f"❌ Слот {slot_id} не найден.")
 
@@ -180,32 +149,123 @@ async def cmd_delete_slot(message: Message):
         except Exception as e:
             await message.answer(f"⚠ Не удалось удалить сообщение в канале: {e}")
 
-    await delete_slot(slot_id)
+    await repo.delete_slot(slot_id)
 
     await message.answer(f"🗑 Слот {slot_id} удалён из БД и из канала.")
     return None
 
 
 @router.message(Command("slots"))
-async def cmd_slots(message: Message):
+async def cmd_slots(message: Message, repo: Repository):
     if message.from_user.id not in ADMINS:
         return await message.answer("⛔ Нет доступа.")
 
-    slots = await get_slots()
+    slots = await repo.get_slots()
     if not slots:
         return await message.answer("📭 Слотов пока нет.")
 
-    text = "\n".join([f"{s['id']}: {s['name']} — {s['price']}₽" for s in slots])
+    text = "\n".join([f"{s['id']}: {s['name']} — {format_price(s['price'])}₽" for s in slots])
     await message.answer("📦 Слоты:\n" + text)
     return None
 
 
+@router.message(Command("cache"))
+async def cmd_cache(message: Message, repo: Repository):
+    if message.from_user.id not in ADMINS:
+        return await message.answer("⛔ Нет доступа.")
+
+    stats = repo.cache_stats()
+    if stats is None:
+        text = "🗄 Хранилище работает без кэша слотов.\n"
+    else:
+        text = (
+            f"🗄 Кэш слотов\n"
+            f"Записей: {stats['size']}\n"
+            f"Попаданий: {stats['hits']}\n"
+            f"Промахов: {stats['misses']}\n"
+            f"Hit rate: {stats['hit_rate']:.0%}\n"
+        )
+    stats = cards.stats()
+    await message.answer(
+        text +
+        f"\n🃏 Карточки слотов\n"
+        f"Записей: {stats['size']}\n"
+        f"Попаданий: {stats['hits']}\n"
+        f"Пересборок: {stats['misses']}\n"
+        f"Hit rate: {stats['hit_rate']:.0%}"
+    )
+    return None
+
+
+@router.message(Command("limits"))
+async def cmd_limits(message: Message, limiter: RateLimiter):
+    if message.from_user.id not in ADMINS:
+        return await message.answer("⛔ Нет доступа.")
+
+    stats = limiter.stats()
+    await message.answer(
+        f"🚦 Исходящие запросы\n"
+        f"В очереди: {stats['waiting']}\n"
+        f"В полёте: {stats['in_flight']}\n"
+        f"Отправлено: {stats['sent']}\n"
+        f"Повторов после 429: {stats['retried']}\n"
+        f"Таймаутов: {stats['timeouts']}\n"
+        f"Макс. ожидание: {stats['max_wait']:.1f} с\n"
+        f"Чатов с лимитом: {stats['chats']}"
+    )
+    return None
+
+
+@router.message(Command("jobs"))
+async def cmd_jobs(message: Message, scheduler: Scheduler):
+    if message.from_user.id not in ADMINS:
+        return await message.answer("⛔ Нет доступа.")
+
+    text = "⏰ Фоновые задачи\n"
+    for job in scheduler.stats():
+        next_run = time.strftime("%H:%M:%S", time.localtime(job["next_run"])) if job["next_run"] else "—"
+        text += (
+            f"\n{'▶' if job['running'] else '•'} {job['name']} ({job['schedule']})\n"
+            f"Запусков: {job['runs']}, ошибок: {job['failures']}, пропущено: {job['skipped']}\n"
+            f"Время: посл. {job['last_duration']:.2f} с, сред. {job['avg_duration']:.2f} с, "
+            f"макс. {job['max_duration']:.2f} с\n"
+            f"Следующий запуск: {next_run}\n"
+        )
+        if job["last_error"]:
+            text += f"Последняя ошибка: {job['last_error']}\n"
+    await message.answer(text)
+    return None
+
+
+@router.message(Command("backup"))
+async def cmd_backup(message: Message, repo: Repository):
+    if message.from_user.id not in ADMINS:
+        return await message.answer("⛔ Нет доступа.")
+    if not isinstance(repo, SQLiteRepository):
+        return await message.answer("⚠ Бэкап доступен только для SQLite-хранилища.")
+
+    await message.answer("💾 Снимаю бэкап...")
+    started = time.monotonic()
+    try:
+        path = await make_backup(repo.path)
+    except Exception as e:
+        return await message.answer(f"❌ Бэкап не удался: {e}")
+
+    await message.answer(
+        f"✅ Бэкап готов: {path.name}\n"
+        f"Размер: {path.stat().st_size // 1024} КБ\n"
+        f"Время: {time.monotonic() - started:.1f} с\n"
+        f"Всего снимков: {len(list_backups())}"
+    )
+    return None
+
+
 @router.message(Command("reset_slots"))
-async def cmd_reset_slots(message: Message):
+async def cmd_reset_slots(message: Message, repo: Repository):
     if message.from_user.id not in ADMINS:
         return await message.answer("❌ У вас недостаточно прав.")
 
-    await reset_slots()
+    await repo.reset_slots()
     await message.answer("♻️ Таблица слотов очищена и пересоздана")
     return None
 
@@ -228,47 +288,52 @@ async def choose_field(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(EditSlotForm.value)
-async def save_edit(message: Message, state: FSMContext):
+async def save_edit(message: Message, state: FSMContext, repo: Repository, captions: CaptionDebouncer):
     data = await state.get_data()
     slot_id = data["slot_id"]
     field = data["field"]
     value = message.text
 
-    await update_slot(slot_id, field, value)
+    if field == "size":
+        await repo.set_slot_sizes(slot_id, [s.strip() for s in value.split(",") if s.strip()])
+    elif field == "price":
+        try:
+            await repo.update_slot(slot_id, field, parse_price(value))
+        except ValueError:
+            return await message.answer("⚠ Введи цену числом, например: 1500 или 1499.90")
+    else:
+        await repo.update_slot(slot_id, field, value)
 
     await message.answer(f"✅ Слот #{slot_id} обновлён: {field} → {value}")
+    captions.schedule(slot_id)
     await state.clear()
+    return None
 
 
 @router.message(Command("postslot"))
-async def post_slot(message: Message):
+async def post_slot(message: Message, repo: Repository, captions: CaptionDebouncer):
     if F.from_user.id.in_(ADMINS):
         try:
             slot_id = int(message.text.split()[1])
         except (IndexError, ValueError):
             return await message.answer("⚠ Используй так: /postslot <id>")
 
-        slot = await get_slot(slot_id)
+        slot = await repo.get_slot(slot_id)
         if not slot:
             return await message.answer("❌ Слот не найден.")
 
-        caption = (
-            f"{slot['name']}\n"
-            f"Размеры: {slot['size']}\n"
-            f"Цена: {slot['price']}₽\n"
-            f"{slot['description']}\n\n"
-            f"👉 Жми кнопку ниже, чтобы заказать!"
-        )
+        card = slot_card(slot)
 
         msg = await message.bot.send_photo(
             chat_id=CHANNEL_ID,
             photo=slot["png"],
-            caption=caption,
-            reply_markup=kb.product_button(slot_id)
+            caption=card.channel_caption,
+            reply_markup=card.product_kb
         )
 
-        await update_slot(slot_id, "channel_id", CHANNEL_ID)
-        await update_slot(slot_id, "message_id", msg.message_id)
+        await repo.update_slot(slot_id, "channel_id", CHANNEL_ID)
+        await repo.update_slot(slot_id, "message_id", msg.message_id)
+        captions.remember(slot_id, card.channel_caption)
 
         await message.answer(f"✅ Слот {slot_id} опубликован в канал и сохранён (msg_id={msg.message_id}).")
 
@@ -278,51 +343,20 @@ async def post_slot(message: Message):
         return None
 
 
-# ---------- Управление заказами ----------
-
-@router.message(F.from_user.id.in_(ADMINS), F.text == "/orders")
-async def list_orders(message: Message):
-    orders = await get_all_orders()
-    if not orders:
-        return await message.answer("📭 Заказов пока нет.")
-
-    text = "📋 Список заказов:\n\n"
-    for order_id, username, slot_id, status, created_at in orders:
-        text += (
-            f"🆔 {order_id} | @{username}\n"
-            f"Товар: {slot_id}\n"
-            f"Статус: {status}\n"
-            f"Дата: {created_at}\n\n"
-        )
-
-    await message.answer(text)
-    return None
-
-
-
-
-
-
 @router.message(F.from_user.id.in_(ADMINS), F.text.startswith("/slot"))
-async def cmd_slot(message: Message):
+async def cmd_slot(message: Message, repo: Repository):
     try:
         slot_id = int(message.text.split()[1])
     except (IndexError, ValueError):
         await message.answer("⚠ Используй: /slot <id>")
         return
 
-    slot = await get_slot(slot_id)
+    slot = await repo.get_slot(slot_id)
     if not slot:
         await message.answer("❌ Слот не найден")
         return
 
-    text = (
-        f"📦 Слот #{slot['id']}\n\n"
-        f"Название: {slot['name']}\n"
-        f"Цена: {slot['price']}\n"
-        f"Размер: {slot.get('size', '—')}\n"
-        f"Описание: {slot.get('description', '—')}\n"
-    )
+    text = slot_card(slot).admin_caption
     photo_url = slot.get('png')
     if photo_url:
         await message.answer_photo(photo=photo_url, caption=text)
@@ -2,9 +2,10 @@ from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery
-from bool_shop.db import add_order_proof, get_user_orders, get_slot, update_order_status
-from bool_shop.bot_token import ADMINS
+from bool_shop.repository import Repository
+from bool_shop.money import format_price
 import bool_shop.keyboards as kb
+import bool_shop.outbox as outbox
 
 router = Router()
 
@@ -17,9 +18,9 @@ class OrderFSM(StatesGroup):
 
 # ================= START CHECKOUT =================
 @router.callback_query(F.data.startswith("checkout:"))
-async def start_checkout(callback: CallbackQuery, state: FSMContext):
+async def start_checkout(callback: CallbackQuery, state: FSMContext, repo: Repository):
     slot_id = int(callback.data.split(":")[1])
-    slot = await get_slot(slot_id)
+    slot = await repo.get_slot(slot_id)
 
     if not slot:
         return await callback.message.answer("❌ Товар не найден.")
@@ -30,7 +31,7 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
         slot_price=slot["price"]
     )
 
-    sizes = slot["size"].split(",") if slot["size"] else ["Стандарт"]
+    sizes = slot["sizes"] or ["Стандарт"]
     await callback.message.answer("Выберите размер:", reply_markup=kb.size_keyboard(slot_id, sizes))
     await state.set_state(OrderFSM.waiting_for_size)
     return None
@@ -38,61 +39,47 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
 
 # ================= RECEIVE PAYMENT =================
 @router.message(F.photo, OrderFSM.waiting_for_proof)
-async def receive_payment(message: Message, state: FSMContext):
+async def receive_payment(message: Message, state: FSMContext, repo: Repository):
     data = await state.get_data()
     order_id = data["order_id"]
     file_id = message.photo[-1].file_id
-    await add_order_proof(order_id, file_id)
-    slot_id = data["slot_id"]
-    size = data["size"]
-    from bool_shop.db import get_slot
-    slot = await get_slot(slot_id)
-
-    product_name = slot["name"]
-    product_price = slot["price"]
-    for admin_id in ADMINS:
-        try:
-            await message.bot.send_photo(
-                chat_id=admin_id,
-                photo=file_id,
-                caption=(
-                    f"Новый платёж!\n\n"
-                    f"Пользователь: @{message.from_user.username or '—'}\n"
-                    f"Telegram ID: <code>{message.from_user.id}</code>\n\n"
-                    f"Заказ #{order_id}\n"
-                    f"Товар: {product_name}\n"
-                    f"Размер: {size}\n"
-                    f"Цена: {product_price}₽"
-                ),
-                reply_markup=kb.payment_approval_kb(order_id)
-            )
-        except Exception as e:
-            print(f"Не удалось отправить админу {admin_id}: {e}")
-        try:
-            await message.delete()
-        except Exception as e:
-            print(f"Не удалось удалить сообщение: {e}")
+    # цена и товар — из самого заказа: цену слота могли поменять, а слот удалить
+    order = await repo.get_order(order_id)
+    if not order:
+        await state.clear()
+        return await message.answer(f"❌ Заказ #{order_id} не найден. Оформите заказ заново.")
+
+    caption = (
+        f"Новый платёж!\n\n"
+        f"Пользователь: @{message.from_user.username or '—'}\n"
+        f"Telegram ID: <code>{message.from_user.id}</code>\n\n"
+        f"Заказ #{order_id}\n"
+        f"Товар: {order.slot_name or '—'}\n"
+        f"Размер: {order.size}\n"
+        f"Цена: {format_price(order.price)}₽"
+    )
+    accepted = await repo.add_order_proof(
+        order_id, file_id,
+        notify=outbox.to_admins(caption, reply_markup=kb.payment_approval_kb(order_id), file_id=file_id)
+    )
+    if not accepted:
+        # заказ уже не ждёт оплаты: бронь истекла или заказ отменён
+        await state.clear()
+        return await message.answer(f"⌛ Заказ #{order_id} больше не ожидает оплаты. Оформите заказ заново.")
+    try:
+        await message.delete()
+    except Exception as e:
+        print(f"Не удалось удалить сообщение: {e}")
 
     await message.answer("✅ Чек отправлен администратору на проверку")
     await state.clear()
 
 
 
-# ================= ПОСЛЕ АДМИНСКОГО ПОДТВЕРЖДЕНИЯ =================
-async def continue_after_payment(user_id: int, order_id: int, bot):
-    """Вызывается админским хендлером после подтверждения"""
-    await update_order_status(order_id, "paid")
-    await bot.send_message(
-        user_id,
-        "✅ Оплата подтверждена!\n\n🚚 Теперь выберите метод получения:",
-        reply_markup=kb.delivery_keyboard
-    )
-
-
 # ================= MY ORDERS =================
 @router.message(F.text == "/myorders")
-async def my_orders(message: Message):
-    orders = await get_user_orders(message.from_user.id)
+async def my_orders(message: Message, repo: Repository):
+    orders = await repo.get_user_orders(message.from_user.id)
     if not orders:
         return await message.answer("📭 У вас пока нет заказов.")
 
@@ -102,7 +89,9 @@ async def my_orders(message: Message):
         "processing": "⚙️ В обработке",
         "shipped": "🚚 Доставляется",
         "completed": "👌 Выполнен",
-        "rejected": "❌ Отменён"
+        "rejected": "❌ Отменён",
+        "declined": "❌ Отменён",
+        "expired": "⌛ Бронь истекла",
 
     }
 
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command
+
+from bool_shop.repository import Repository, order_key
+from bool_shop.money import format_price
+from bool_shop.bot_token import ADMINS
+import bool_shop.keyboards as kb
+
+router = Router()
+
+# в БД время хранится в UTC (epoch), в МСК переводим только при выводе
+MSK = timezone(timedelta(hours=3))
+
+
+def format_ts(ts: int) -> str:
+    return datetime.fromtimestamp(ts, MSK).strftime("%d.%m.%Y %H:%M")
+
+
+# ---------- Рендер страниц ----------
+# Каждый отчёт: как достать страницу, как закодировать ключ строки
+# в callback_data и как отрисовать строку.
+
+def _history_line(o):
+    return (
+        f"📦 Заказ #{o.id}\n"
+        f"👤 @{o.username or '—'}\n"
+        f"📌 {o.slot_name} — {o.size or '—'}\n"
+        f"📊 Статус: {o.status}\n"
+        f"🕒 {format_ts(o.created_at)}\n\n"
+    )
+
+
+def _active_line(o):
+    return (
+        f"🆔 {o.id} | @{o.username}\n"
+        f"Товар: {o.slot_name}\n"
+        f"Статус: {o.status}\n"
+        f"Дата: {format_ts(o.created_at)}\n\n"
+    )
+
+
+def _buyer_line(u):
+    return (
+        f"🆔 {u.tg_id} | @{u.username or '—'}\n"
+        f"📦 Активные слоты: {u.active_slots}\n\n"
+    )
+
+
+def _user_line(u):
+    return (
+        f"🆔 {u.tg_id} | @{u.username or '—'}\n"
+        f"👑 Покупатель: {'✅' if u.buyer else '❌'}\n"
+        f"📦 Активные слоты: {u.active_slots}\n\n"
+    )
+
+
+def _encode_order_key(o) -> str:
+    created_at, order_id = order_key(o)
+    return f"{created_at}_{order_id}"
+
+
+def _decode_order_key(key: str) -> tuple:
+    created_at, order_id = key.split("_")
+    return int(created_at), int(order_id)
+
+
+REPORTS = {
+    "history": {
+        "title": "📜 История заказов:\n\n",
+        "empty": "📭 История заказов пуста.",
+        "fetch": lambda repo, **page: repo.get_orders_page(**page),
+        "line": _history_line,
+        "encode": _encode_order_key,
+        "decode": _decode_order_key,
+    },
+    "orders": {
+        "title": "📋 Список заказов:\n\n",
+        "empty": "📭 Заказов пока нет.",
+        "fetch": lambda repo, **page: repo.get_orders_page(active=True, **page),
+        "line": _active_line,
+        "encode": _encode_order_key,
+        "decode": _decode_order_key,
+    },
+    "buyers": {
+        "title": "👥 Список покупателей:\n\n",
+        "empty": "📭 Нет покупателей.",
+        "fetch": lambda repo, **page: repo.get_users_page(buyers_only=True, **page),
+        "line": _buyer_line,
+        "encode": lambda u: str(u.tg_id),
+        "decode": int,
+    },
+    "users": {
+        "title": "👥 Все пользователи:\n\n",
+        "empty": "📭 Пользователей нет.",
+        "fetch": lambda repo, **page: repo.get_users_page(**page),
+        "line": _user_line,
+        "encode": lambda u: str(u.tg_id),
+        "decode": int,
+    },
+}
+
+
+async def render_page(repo: Repository, name: str, direction: str | None = None, key: str | None = None):
+    """Возвращает (text, markup) для страницы отчёта или (None, None), если строк нет"""
+    report = REPORTS[name]
+    has_prev = has_next = False
+    if direction == "next":
+        rows, has_next = await report["fetch"](repo, after=report["decode"](key))
+        has_prev = True
+    elif direction == "prev":
+        rows, has_prev = await report["fetch"](repo, before=report["decode"](key))
+        has_next = True
+    else:
+        rows, has_next = await report["fetch"](repo)
+
+    if not rows:
+        return None, None
+
+    text = report["title"] + "".join(report["line"](row) for row in rows)
+    markup = kb.pager_kb(name, report["encode"](rows[0]), report["encode"](rows[-1]), has_prev, has_next)
+    return text, markup
+
+
+async def send_report(message: Message, repo: Repository, name: str):
+    if message.from_user.id not in ADMINS:
+        return await message.answer("⛔ Нет доступа.")
+
+    text, markup = await render_page(repo, name)
+    if not text:
+        return await message.answer(REPORTS[name]["empty"])
+    await message.answer(text, reply_markup=markup)
+    return None
+
+
+# ---------- Команды ----------
+
+@router.message(Command("all_orders"))
+async def all_orders(message: Message, repo: Repository):
+    return await send_report(message, repo, "history")
+
+
+@router.message(Command("orders"))
+async def list_orders(message: Message, repo: Repository):
+    return await send_report(message, repo, "orders")
+
+
+@router.message(Command("check_buyer"))
+async def check_buyer(message: Message, repo: Repository):
+    return await send_report(message, repo, "buyers")
+
+
+@router.message(Command("check"))
+async def check_users(message: Message, repo: Repository):
+    return await send_report(message, repo, "users")
+
+
+@router.message(Command("revenue"))
+async def revenue(message: Message, repo: Repository):
+    """/revenue [дней] — выручка по выполненным заказам, по умолчанию за 30 дней"""
+    if message.from_user.id not in ADMINS:
+        return await message.answer("⛔ Нет доступа.")
+
+    try:
+        days = int(message.text.split()[1])
+    except (IndexError, ValueError):
+        days = 30
+
+    since = int(datetime.now(timezone.utc).timestamp()) - days * 86400
+    count, total = await repo.get_revenue(since)
+    low, high = await repo.get_price_range()
+    prices = f"{format_price(low)}₽ — {format_price(high)}₽" if low is not None else "—"
+    await message.answer(
+        f"💰 Выручка за {days} дн.: {format_price(total)}₽\n"
+        f"📦 Выполнено заказов: {count}\n"
+        f"🏷 Цены в каталоге: {prices}"
+    )
+    return None
+
+
+@router.callback_query(F.data.startswith("page:"))
+async def flip_page(callback: CallbackQuery, repo: Repository):
+    if callback.from_user.id not in ADMINS:
+        return await callback.answer("⛔ Нет доступа", show_alert=True)
+
+    _, name, direction, key = callback.data.split(":", 3)
+    if name not in REPORTS:
+        return await callback.answer("⚠ Неизвестный отчёт", show_alert=True)
+
+    text, markup = await render_page(repo, name, direction, key)
+    if not text:
+        return await callback.answer("📭 Больше ничего нет")
+
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+    return None
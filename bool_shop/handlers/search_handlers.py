@@ -0,0 +1,100 @@
+from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, InputMediaPhoto
+from aiogram.filters import Command, CommandObject
+from aiogram.dispatcher.event.bases import SkipHandler
+
+import bool_shop.keyboards as kb
+from bool_shop.repository import Repository
+from bool_shop.states import SearchFSM
+from bool_shop.cards import slot_card
+
+router = Router()
+
+
+async def find_card(repo: Repository, query: str, position: int):
+    """Карточка на позиции position в выдаче. Возвращает (slot, всего найдено)"""
+    ids, total = await repo.search_slots(query, offset=position, limit=1)
+    if not ids:
+        return None, total
+    return await repo.get_slot(ids[0]), total
+
+
+async def send_results(message: Message, state: FSMContext, repo: Repository, query: str):
+    slot, total = await find_card(repo, query, 0)
+    if not slot:
+        return await message.answer(f"🔎 По запросу «{query}» ничего не найдено.")
+
+    # запрос храним в данных FSM, чтобы листать выдачу по кнопкам; состояние
+    # не трогаем — поиск посреди оформления заказа не должен его сбрасывать
+    await state.update_data(search_query=query)
+    await message.answer_photo(
+        photo=slot["png"],
+        caption=slot_card(slot).search_caption,
+        reply_markup=kb.search_card_kb(slot["id"], 0, total)
+    )
+    return None
+
+
+async def ask_query(message: Message, state: FSMContext):
+    """Ждём запрос следующим сообщением — только если пользователь ничего не оформляет:
+    иначе ожидание запроса заменило бы состояние заказа, и чек уже не приняли бы"""
+    if await state.get_state() not in (None, SearchFSM.waiting_query.state):
+        return await message.answer("⚠ Сначала завершите оформление или ищите сразу: /search <запрос>")
+    await state.set_state(SearchFSM.waiting_query)
+    return await message.answer("🔎 Введите название или хэштег:")
+
+
+@router.message(SearchFSM.waiting_query, F.text.startswith("/"))
+async def leave_search(message: Message, state: FSMContext):
+    # команда вместо запроса: ожидание снимаем, команду разбирают её хендлеры
+    await state.set_state(None)
+    raise SkipHandler
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext, repo: Repository):
+    if not command.args:
+        return await ask_query(message, state)
+    await send_results(message, state, repo, command.args.strip())
+    return None
+
+
+@router.callback_query(F.data == "search")
+async def search_button(callback: CallbackQuery, state: FSMContext):
+    await ask_query(callback.message, state)
+    await callback.answer()
+
+
+@router.message(SearchFSM.waiting_query, ~F.text.startswith("/"))
+async def search_query(message: Message, state: FSMContext, repo: Repository):
+    if not message.text:
+        return await message.answer("⚠ Отправьте запрос текстом.")
+    # в SearchFSM.waiting_query попадают только без другого состояния, так что сбрасывать нечего
+    await state.set_state(None)
+    await send_results(message, state, repo, message.text.strip())
+    return None
+
+
+@router.callback_query(F.data.startswith("search:"))
+async def flip_card(callback: CallbackQuery, state: FSMContext, repo: Repository):
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        return await callback.answer("Поиск устарел, повторите /search", show_alert=True)
+
+    position = int(callback.data.split(":")[1])
+    slot, total = await find_card(repo, query, position)
+    if not slot:
+        return await callback.answer("Товар больше не доступен", show_alert=True)
+
+    await callback.message.edit_media(
+        InputMediaPhoto(media=slot["png"], caption=slot_card(slot).search_caption),
+        reply_markup=kb.search_card_kb(slot["id"], position, total)
+    )
+    await callback.answer()
+    return None
+
+
+@router.callback_query(F.data == "noop")
+async def noop(callback: CallbackQuery):
+    await callback.answer()
@@ -34,7 +34,8 @@ def product_button(slot_id: int):
 
 inline_kb = InlineKeyboardMarkup(
     inline_keyboard=[
-        [InlineKeyboardButton(text="📃Каталог", url="https://t.me/BollShopCatalog")],
+        [InlineKeyboardButton(text="📃Каталог", url="https://t.me/BollShopCatalog"),
+         InlineKeyboardButton(text="🔎Поиск", callback_data="search")],
         [InlineKeyboardButton(text="⚙️О нас", callback_data="about"), InlineKeyboardButton(text="◀️Назад", callback_data="back")]
     ]
 )
@@ -110,4 +111,31 @@ def admin_confirm_kb(order_id: int):
     kb.button(text="✅ Подтверждаю", callback_data=f"admin_confirm:{order_id}")
     kb.button(text="❌ Отклоняю", callback_data=f"admin_reject:{order_id}")
     kb.adjust(2)
-    return kb.as_markup()
\ No newline at end of file
+    return kb.as_markup()
+
+def pager_kb(report: str, first_key: str, last_key: str, has_prev: bool, has_next: bool):
+    """◀️/▶️ для постраничных отчётов; ключи — keyset-курсоры первой и последней строки"""
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"page:{report}:prev:{first_key}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"page:{report}:next:{last_key}"))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+def search_card_kb(slot_id: int, position: int, total: int):
+    """карточка результата поиска: листалка ◀️ n/total ▶️ и кнопка оформления"""
+    nav = []
+    if position > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"search:{position - 1}"))
+    nav.append(InlineKeyboardButton(text=f"{position + 1}/{total}", callback_data="noop"))
+    if position + 1 < total:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"search:{position + 1}"))
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            nav,
+            [InlineKeyboardButton(text="🛒 Оформить", callback_data=f"checkout:{slot_id}")],
+        ]
+    )
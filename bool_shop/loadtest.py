@@ -0,0 +1,149 @@
+"""Нагрузочный прогон webhook-режима без сети и без Telegram.
+
+Поднимает WebhookServer на localhost с MemoryRepository и сессией бота,
+которая отвечает на Bot API локально (с задержкой --rtt, как у настоящего
+Telegram), и шлёт в него поддельные апдейты от разных пользователей —
+так, как это делал бы Telegram. В конце печатает пропускную способность
+и перцентили времени ответа webhook.
+
+    python -m bool_shop.loadtest --updates 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from datetime import datetime
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message
+
+from bool_shop.channel import CaptionDebouncer
+from bool_shop.handlers import setup_routers
+from bool_shop.memory import MemoryRepository
+from bool_shop.middlewares import UserOrderingMiddleware
+from bool_shop.webhook import SECRET_HEADER, WebhookServer, run_webhook
+
+FAKE_TOKEN = "42:loadtest"
+TEXTS = ("/start", "🛒Меню", "/search nike", "/myorders", "/help")
+RETRY_DELAY = 0.1  # сек до повторной доставки после 503
+
+
+class LocalSession(BaseSession):
+    """Bot API «на месте»: любой метод успешен, сообщения получают новые id"""
+
+    def __init__(self, rtt: float = 0.0):
+        super().__init__()
+        self.rtt = rtt
+        self.calls = 0
+        self._ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        if method.__returning__ is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def fake_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def post_updates(url: str, secret: str, total: int, concurrency: int, users: int):
+    latencies, statuses = [], {}
+    counter = itertools.count(1)
+
+    async def client(session):
+        while (n := next(counter)) <= total:
+            body = fake_update(n, 1_000_000 + n % users, TEXTS[n % len(TEXTS)])
+            while True:
+                started = time.perf_counter()
+                async with session.post(url, json=body, headers={SECRET_HEADER: secret}) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+                if response.status != 503:
+                    break
+                # как Telegram: не-200 — доставить позже
+                await asyncio.sleep(RETRY_DELAY)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    return latencies, statuses
+
+
+async def main(args):
+    repo = MemoryRepository()
+    await repo.add_slot("Nike Air", "photo", ["40", "41", "42"], 100_000, None, "#nike #кроссовки")
+    session = LocalSession(args.rtt)
+    bot = Bot(FAKE_TOKEN, session=session)
+    dp = Dispatcher(repo=repo, captions=CaptionDebouncer(bot, repo))
+    ordering = UserOrderingMiddleware()
+    dp.update.outer_middleware(ordering)
+    setup_routers(dp)
+
+    server = WebhookServer(dp, bot, secret="loadtest", queue_size=args.queue, workers=args.workers)
+    serving = asyncio.create_task(run_webhook(dp, bot, url=None, host="127.0.0.1", port=args.port, server=server))
+    await asyncio.sleep(0.3)
+
+    started = time.perf_counter()
+    latencies, statuses = await post_updates(
+        f"http://127.0.0.1:{args.port}{server.path}", server.secret, args.updates, args.concurrency, args.users
+    )
+    accepted = time.perf_counter() - started
+    await server.queue.join()
+    # апдейты, отложенные в очереди пользователей, воркер уже отпустил
+    await ordering.close()
+    processed = time.perf_counter() - started
+
+    serving.cancel()
+    await asyncio.gather(serving, return_exceptions=True)
+
+    print(f"HTTP ответы: {statuses}")
+    print(f"Приём: {args.updates / accepted:.0f} апд/с, обработка: {server.processed / processed:.0f} апд/с")
+    print(
+        f"Ответ webhook: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, p99 {percentile(latencies, 0.99) * 1000:.1f} мс"
+    )
+    print(f"Статистика сервера: {server.stats()}, вызовов Bot API: {session.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных POST от «Telegram»")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--queue", type=int, default=1000)
+    parser.add_argument("--rtt", type=float, default=0.05, help="сек на вызов Bot API")
+    parser.add_argument("--port", type=int, default=8081)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,401 @@
+"""Хранилище в памяти процесса — та же семантика, что у SQLiteRepository.
+
+Нужно для тестов и нагрузочных прогонов хендлеров: без диска, пула и
+миграций остаётся только стоимость нашего собственного кода. Данные
+живут в словарях, страницы отчётов собираются через heapq.nlargest /
+nsmallest (top-N без сортировки всей таблицы), поиск — по токенам
+названия и описания. Между процессами ничего не сохраняется.
+"""
+import heapq
+import re
+import time
+import unicodedata
+from collections.abc import Callable, Iterable
+
+from bool_shop.models import Notification, Slot, Order, User
+from bool_shop.repository import (
+    Repository, PAGE_SIZE, ACTIVE_STATUSES, RELEASE_STATUSES, RESERVATION_BATCH, TERMINAL_STATUSES, order_key,
+)
+
+SLOT_FIELDS = ("name", "png", "price", "description", "user_id", "channel_id", "message_id")
+ORDER_LIST_FIELDS = ("id", "username", "slot_name", "size", "status", "created_at")
+
+
+def tokenize(text: str | None) -> list[str]:
+    """слова в нижнем регистре без диакритики — как unicode61 remove_diacritics в FTS5"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.findall(r"\w+", text)
+
+
+class MemoryRepository(Repository):
+    def __init__(self):
+        self.users: dict[int, User] = {}
+        self.slots: dict[int, Slot] = {}
+        self.sizes: dict[int, dict[str, int]] = {}  # slot_id -> {размер: остаток}, в порядке добавления
+        self.orders: dict[int, Order] = {}
+        self.archive: dict[int, Order] = {}
+        self._slot_seq = 0
+        self._order_seq = 0
+        self.idempotency: dict[str, int] = {}  # ключ -> id заказа
+        self.reserved_until: dict[int, int] = {}  # id заказа -> срок брони, пока чек не прислан
+        self.outbox: dict[int, Notification] = {}
+        self._outbox_seq = 0
+
+    # ================= USERS =================
+
+    async def add_user(self, user):
+        if user.id not in self.users:
+            self.users[user.id] = User(tg_id=user.id, username=user.username or "unknown", buyer=0, active_slots=0)
+
+    async def get_users(self):
+        return [(u.tg_id, u.username) for u in self.users.values()]
+
+    async def mark_as_buyer(self, tg_id: int):
+        if tg_id in self.users:
+            self.users[tg_id].buyer = 1
+
+    async def get_all_users(self):
+        return [self._user_row(u) for u in self.users.values()]
+
+    @staticmethod
+    def _user_row(user: User) -> User:
+        return User(tg_id=user.tg_id, username=user.username, buyer=user.buyer, active_slots=user.active_slots)
+
+    # ================= SLOTS =================
+
+    async def add_slot(self, name: str, png: str, sizes: list[str], price: int, user_id: int, description: str = None):
+        self._slot_seq += 1
+        slot_id = self._slot_seq
+        self.slots[slot_id] = Slot(id=slot_id, name=name, png=png, price=price, user_id=user_id,
+                                   description=description)
+        self.sizes[slot_id] = {}
+        self._insert_sizes(slot_id, sizes)
+        return slot_id
+
+    def _insert_sizes(self, slot_id: int, sizes: list[str]):
+        """повторяющийся размер = ещё одна единица на складе"""
+        stock = self.sizes[slot_id]
+        for size in sizes:
+            if size:
+                stock[size] = stock.get(size, 0) + 1
+
+    async def set_slot_sizes(self, slot_id: int, sizes: list[str]):
+        if slot_id in self.slots:
+            self.sizes[slot_id] = {}
+            self._insert_sizes(slot_id, sizes)
+
+    async def update_slot_size(self, slot_id: int, new_size: str):
+        if slot_id not in self.slots:
+            return False
+        stock = self.sizes[slot_id]
+        stock[new_size] = max(stock.get(new_size, 0), 1)
+        return True
+
+    async def reserve_size(self, slot_id: int, size: str) -> bool:
+        stock = self.sizes.get(slot_id, {})
+        if stock.get(size, 0) > 0:
+            stock[size] -= 1
+            return True
+        return False
+
+    async def save_slot_post(self, slot_id: int, channel_id: int, message_id: int):
+        slot = self.slots.get(slot_id)
+        if slot:
+            slot.channel_id, slot.message_id = channel_id, message_id
+
+    @staticmethod
+    def _list_row(slot: Slot) -> Slot:
+        return Slot(id=slot.id, name=slot.name, price=slot.price, user_id=slot.user_id)
+
+    async def get_slots(self):
+        return [self._list_row(s) for s in self.slots.values()]
+
+    async def get_slot(self, slot_id: int):
+        slot = self.slots.get(slot_id)
+        if not slot:
+            return None
+        fields = {name: getattr(slot, name) for name in SLOT_FIELDS}
+        sizes = [size for size, qty in self.sizes[slot_id].items() if qty > 0]
+        return Slot(id=slot.id, sizes=sizes, **fields)
+
+    async def update_slot(self, slot_id: int, field: str, value):
+        if field not in SLOT_FIELDS:
+            raise ValueError(f"нет такого поля: {field}")
+        slot = self.slots.get(slot_id)
+        if slot:
+            setattr(slot, field, value)
+
+    async def get_user_slots(self, user_id: int):
+        return [self._list_row(s) for s in self.slots.values() if s.user_id == user_id]
+
+    async def delete_slot(self, slot_id: int):
+        self.slots.pop(slot_id, None)
+        self.sizes.pop(slot_id, None)
+
+    async def reset_slots(self):
+        self.slots.clear()
+        self.sizes.clear()
+        self._slot_seq = 0
+
+    # ================= ORDERS =================
+
+    async def create_order(
+        self,
+        user_id: int,
+        slot_id: int,
+        username: str | None = None,
+        size: str | None = None,
+        delivery: str | None = None,
+        address: str | None = None,
+        idempotency_key: str | None = None,
+        reserve_for: int | None = None,
+    ):
+        if idempotency_key is not None and self.idempotency.get(idempotency_key) in self.orders:
+            return self.idempotency[idempotency_key]
+        if reserve_for is not None and not await self.reserve_size(slot_id, size):
+            return None
+        slot = self.slots.get(slot_id)
+        self._order_seq += 1
+        self.orders[self._order_seq] = Order(
+            id=self._order_seq, user_id=user_id, username=username, slot_id=slot_id, size=size,
+            delivery=delivery, address=address, status="pending", created_at=int(time.time()),
+            reserved=int(reserve_for is not None), price=slot.price if slot else None,
+        )
+        if reserve_for is not None:
+            self.reserved_until[self._order_seq] = int(time.time()) + reserve_for
+        if idempotency_key is not None:
+            self.idempotency[idempotency_key] = self._order_seq
+        return self._order_seq
+
+    def _set_status(self, order: Order, status: str):
+        """счётчик users.active_slots, который в SQLite ведут триггеры"""
+        user = self.users.get(order.user_id)
+        if user:
+            user.active_slots += (status in ACTIVE_STATUSES) - (order.status in ACTIVE_STATUSES)
+        order.status = status
+
+    async def get_order_user(self, order_id: int):
+        order = self.orders.get(order_id)
+        slot = order and self.slots.get(order.slot_id)
+        return (order.user_id, slot.name) if slot else None
+
+    def _release(self, orders: list[Order]) -> set[int]:
+        """брони заказов — обратно на склад; возвращает id слотов"""
+        slot_ids = set()
+        for order in orders:
+            if not order.reserved:
+                continue
+            if order.slot_id in self.slots:
+                stock = self.sizes[order.slot_id]
+                stock[order.size] = stock.get(order.size, 0) + 1
+            order.reserved = 0
+            self.reserved_until.pop(order.id, None)
+            slot_ids.add(order.slot_id)
+        return slot_ids
+
+    def _enqueue(self, notify: Iterable[Notification]):
+        before = self._outbox_seq
+        for n in notify:
+            self._outbox_seq += 1
+            self.outbox[self._outbox_seq] = Notification(
+                id=self._outbox_seq, chat_id=n.chat_id, text=n.text, photo=n.photo,
+                reply_markup=n.reply_markup, attempts=0, next_at=0,
+            )
+        if self._outbox_seq != before:
+            self.outbox_ready.set()
+
+    async def update_order_address(self, order_id: int, address: str, status: str | None = None,
+                                   notify: Iterable[Notification] = ()) -> bool:
+        order = self.orders.get(order_id)
+        if not order or (order.address == address and (not status or order.status == status)):
+            return False
+        order.address = address
+        if status:
+            self._set_status(order, status)
+        self._enqueue(notify)
+        return True
+
+    async def update_order_delivery(self, order_id: int, delivery: str, status: str | None = None,
+                                    notify: Iterable[Notification] = ()) -> bool:
+        order = self.orders.get(order_id)
+        if not order or (order.delivery == delivery and (not status or order.status == status)):
+            return False
+        order.delivery = delivery
+        if status:
+            self._set_status(order, status)
+        self._enqueue(notify)
+        return True
+
+    async def decline_order(self, order_id: int, notify: Iterable[Notification] = ()) -> bool:
+        order = self.orders.get(order_id)
+        if not order or order.status == "declined":
+            return False
+        order.delivery = order.address = None
+        self._set_status(order, "declined")
+        self._release([order])
+        self._enqueue(notify)
+        return True
+
+    async def update_order_status(self, order_id: int, status: str, notify: Iterable[Notification] = ()) -> bool:
+        order = self.orders.get(order_id)
+        if not order or order.status == status:
+            return False
+        self._set_status(order, status)
+        if status in RELEASE_STATUSES:
+            self._release([order])
+        self._enqueue(notify)
+        return True
+
+    async def add_order_proof(self, order_id: int, proof_file_id: str, notify: Iterable[Notification] = ()) -> bool:
+        order = self.orders.get(order_id)
+        if not order or order.status != "pending" or order.proof == proof_file_id:
+            return False
+        order.proof = proof_file_id
+        self.reserved_until.pop(order_id, None)
+        self._enqueue(notify)
+        return True
+
+    async def expire_reservations(self, now: int, limit: int = RESERVATION_BATCH,
+                                  notify: Callable[[Order], Notification] | None = None) -> set[int]:
+        expired = []
+        for order_id, until in self.reserved_until.items():
+            order = self.orders.get(order_id)
+            if until < now and order and order.status == "pending":
+                expired.append(order)
+                if len(expired) >= limit:
+                    break
+        slot_ids = self._release(expired)
+        for order in expired:
+            self._set_status(order, "expired")
+        if notify:
+            self._enqueue(notify(order) for order in expired)
+        return slot_ids
+
+    async def get_user_orders(self, user_id: int):
+        orders = [o for table in (self.orders, self.archive) for o in table.values() if o.user_id == user_id]
+        orders.sort(key=lambda o: o.created_at, reverse=True)
+        return [(o.id, o.slot_id, o.size, o.address, o.status) for o in orders]
+
+    async def get_order(self, order_id: int) -> Order | None:
+        order = self.orders.get(order_id)
+        if not order:
+            return None
+        # как LEFT JOIN в SQLite: заказ удалённого слота остаётся, только без названия
+        slot = self.slots.get(order.slot_id)
+        fields = {name: getattr(order, name) for name in Order.__slots__}
+        fields.update(slot_name=slot.name if slot else None)
+        return Order(**fields)
+
+    # ================= OUTBOX =================
+
+    async def get_outbox(self, now: float, limit: int) -> list[Notification]:
+        due, delayed = [], set()
+        for n in self.outbox.values():  # dict хранит порядок вставки = порядок id
+            if n.next_at > now:
+                delayed.add(n.chat_id)
+            elif n.chat_id not in delayed:
+                due.append(n)
+                if len(due) >= limit:
+                    break
+        return [Notification(**{name: getattr(n, name) for name in Notification.__slots__}) for n in due]
+
+    async def ack_outbox(self, ids: list[int]):
+        for i in ids:
+            self.outbox.pop(i, None)
+
+    async def retry_outbox(self, retries: list[tuple[int, float, bool]]):
+        for i, next_at, failed in retries:
+            n = self.outbox.get(i)
+            if n:
+                n.next_at = next_at
+                n.attempts += int(failed)
+
+    # ================= REPORTS =================
+
+    async def get_orders_page(self, active: bool = False, after: tuple | None = None,
+                              before: tuple | None = None, limit: int = PAGE_SIZE):
+        tables = (self.orders,) if active else (self.orders, self.archive)
+        orders = (o for table in tables for o in table.values())
+        if active:
+            orders = (o for o in orders if o.status in ACTIVE_STATUSES)
+        # как JOIN в SQLite: заказы без пользователя или слота в отчёт не попадают
+        orders = (o for o in orders if o.user_id in self.users and o.slot_id in self.slots)
+
+        if after:
+            rows = heapq.nlargest(limit + 1, (o for o in orders if order_key(o) < tuple(after)), key=order_key)
+        elif before:
+            rows = heapq.nsmallest(limit + 1, (o for o in orders if order_key(o) > tuple(before)), key=order_key)
+        else:
+            rows = heapq.nlargest(limit + 1, orders, key=order_key)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+        return [
+            Order(id=o.id, username=self.users[o.user_id].username, slot_name=self.slots[o.slot_id].name,
+                  size=o.size, status=o.status, created_at=o.created_at)
+            for o in rows
+        ], has_more
+
+    async def get_users_page(self, buyers_only: bool = False, after: int | None = None,
+                             before: int | None = None, limit: int = PAGE_SIZE):
+        users = (u for u in self.users.values() if u.buyer or not buyers_only)
+        key = lambda u: u.tg_id
+        if after is not None:
+            rows = heapq.nsmallest(limit + 1, (u for u in users if u.tg_id > after), key=key)
+        elif before is not None:
+            rows = heapq.nlargest(limit + 1, (u for u in users if u.tg_id < before), key=key)
+        else:
+            rows = heapq.nsmallest(limit + 1, users, key=key)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return [self._user_row(u) for u in rows], has_more
+
+    async def get_revenue(self, since: int = 0):
+        orders = [
+            o for table in (self.orders, self.archive) for o in table.values()
+            if o.status == "completed" and o.created_at >= since
+        ]
+        return len(orders), sum(o.price or 0 for o in orders)
+
+    async def get_price_range(self):
+        prices = [s.price for s in self.slots.values()]
+        return (min(prices), max(prices)) if prices else (None, None)
+
+    async def search_slots(self, text: str, offset: int = 0, limit: int = PAGE_SIZE):
+        """Префиксный поиск по словам; название весит больше хэштегов, как bm25 в SQLite"""
+        words = tokenize(text)
+        if not words:
+            return [], 0
+
+        scored = []
+        for slot in self.slots.values():
+            name, description = tokenize(slot.name), tokenize(slot.description)
+            score = 0
+            for word in words:
+                hits = 10 * sum(t.startswith(word) for t in name) + sum(t.startswith(word) for t in description)
+                if not hits:
+                    break
+                score += hits
+            else:
+                scored.append((-score, slot.id))
+
+        scored.sort()
+        return [slot_id for _, slot_id in scored[offset:offset + limit]], len(scored)
+
+    # ================= ARCHIVE =================
+
+    async def archive_orders(self, older_than: int, batch_size: int = 500) -> int:
+        cutoff = int(time.time()) - older_than
+        stale = [o.id for o in self.orders.values() if o.status in TERMINAL_STATUSES and o.created_at < cutoff]
+        for order_id in stale:
+            self.archive[order_id] = self.orders.pop(order_id)
+            self.reserved_until.pop(order_id, None)
+        return len(stale)
@@ -0,0 +1,254 @@
+"""Middleware диспетчера."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import AnswerCallbackQuery
+from aiogram.types import CallbackQuery, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+USER_QUEUE_LIMIT = 20  # апдейтов одного пользователя ждут очереди, остальные отбрасываются
+ACK_BUDGET = 0.5  # сек: столько хендлер может сам ответить на нажатие
+ACK_ERROR_TEXT = "⚠ Что-то пошло не так, попробуйте ещё раз."
+DEDUP_WINDOW = 2.0  # сек: повтор того же нажатия после завершения тоже глушим
+
+
+class UserOrderingMiddleware(BaseMiddleware):
+    """Апдейты разных пользователей обрабатываются параллельно, одного — строго по очереди.
+
+    Ставится outer-middleware на dp.update, после UserContextMiddleware
+    диспетчера, поэтому в data уже есть event_from_user / event_chat.
+    Без этого при параллельной обработке два быстрых нажатия одного
+    пользователя гонялись бы за его FSM (waiting_for_size → waiting_for_proof).
+
+    Слот диспетчера (tasks_concurrency_limit в polling, воркер в webhook) апдейт
+    держит только пока обрабатывается, а не пока ждёт своей очереди: если
+    пользователь занят, апдейт кладётся в его очередь и слот сразу
+    освобождается. Очередь разбирает отдельная задача пользователя, так что
+    серия сообщений одного пользователя не задерживает остальных. В очереди
+    не больше limit апдейтов, лишние отбрасываются.
+    """
+
+    def __init__(self, limit: int = USER_QUEUE_LIMIT):
+        self.limit = limit
+        self._queues: dict[Any, deque] = {}  # key -> ожидающие (handler, event, data); есть ключ — пользователь занят
+        self._tasks: set[asyncio.Task] = set()
+        self.deferred = 0
+        self.dropped = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        key = user.id if user else chat.id if chat else None
+        if key is None:
+            return await handler(event, data)
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            if len(queue) >= self.limit:
+                self.dropped += 1
+                logger.warning(f"Очередь апдейтов пользователя {key} переполнена, апдейт отброшен")
+                return None
+            self.deferred += 1
+            queue.append((handler, event, data))
+            return None
+
+        # пользователь свободен — обрабатываем сразу, в слоте диспетчера
+        queue = self._queues[key] = deque()
+        try:
+            return await handler(event, data)
+        finally:
+            if queue:
+                task = asyncio.create_task(self._drain(key, queue))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            else:
+                del self._queues[key]
+
+    async def _drain(self, key, queue: deque):
+        try:
+            while queue:
+                handler, event, data = queue.popleft()
+                try:
+                    await handler(event, data)
+                except Exception:
+                    # ErrorsMiddleware диспетчера уже позади: логируем сами
+                    logger.exception(f"Ошибка обработки отложенного апдейта пользователя {key}")
+        finally:
+            del self._queues[key]
+
+    async def close(self):
+        """Остановка бота: дорабатываем очереди пользователей"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "busy_users": len(self._queues),
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "deferred": self.deferred,
+            "dropped": self.dropped,
+        }
+
+
+class FastAckMiddleware(BaseMiddleware):
+    """Ответ на нажатие кнопки не позже чем через ACK_BUDGET секунд.
+
+    Outer-middleware на dp.callback_query. Хендлер запускается отдельной
+    задачей; если за budget он сам вызвал callback.answer(...) — ответ
+    (текст, алерт) уходит как есть. Иначе отвечаем пустым answer, чтобы у
+    пользователя перестали крутиться часики, а хендлер дорабатывает дальше.
+    Его поздний callback.answer(...) глушит session_middleware — второй
+    ответ на тот же запрос Telegram отклонил бы ошибкой.
+
+    Апдейт считается обработанным, только когда задача хендлера закончилась,
+    поэтому порядок апдейтов одного пользователя (UserOrderingMiddleware)
+    сохраняется. Ошибку хендлера пользователь видит алертом, если ответ ещё
+    не ушёл, или сообщением, если ушёл; исключение идёт дальше в диспетчер.
+    """
+
+    def __init__(self, budget: float = ACK_BUDGET):
+        self.budget = budget
+        self._answered: dict[str, bool] = {}  # callback_query_id -> ответ уже ушёл
+        self._tasks: set[asyncio.Task] = set()
+        self.session_middleware = _AnswerOnce(self)
+        self.auto_acked = 0
+        self.late_answers = 0
+        self.errors = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, CallbackQuery):
+            return await handler(event, data)
+
+        self._answered[event.id] = False
+        task = asyncio.create_task(handler(event, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        try:
+            await asyncio.wait({task}, timeout=self.budget)
+            failed = task.done() and not task.cancelled() and task.exception() is not None
+            # упавший хендлер получит алерт с ошибкой ниже, в except
+            if not failed and not self._answered[event.id]:
+                await self._ack(event)
+            return await task
+        except Exception:
+            self.errors += 1
+            if self._answered[event.id]:
+                await self._report(event)
+            else:
+                await self._ack(event, ACK_ERROR_TEXT)
+            raise
+        finally:
+            del self._answered[event.id]
+
+    async def _ack(self, event: CallbackQuery, alert: str | None = None):
+        if alert is None:
+            self.auto_acked += 1
+        try:
+            await event.answer(alert, show_alert=alert is not None)
+        except TelegramBadRequest as e:
+            # запрос устарел (бот лежал дольше, чем Telegram ждёт ответа)
+            logger.warning(f"Не удалось ответить на callback {event.id}: {e}")
+
+    async def _report(self, event: CallbackQuery):
+        try:
+            await event.bot.send_message(event.from_user.id, ACK_ERROR_TEXT)
+        except Exception as e:
+            logger.warning(f"Не удалось сообщить пользователю {event.from_user.id} об ошибке: {e}")
+
+    async def close(self):
+        """Остановка бота: дожидаемся хендлеров, которые ещё работают"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tasks),
+            "auto_acked": self.auto_acked,
+            "late_answers": self.late_answers,
+            "errors": self.errors,
+        }
+
+
+class _AnswerOnce(BaseRequestMiddleware):
+    """Первый answerCallbackQuery на нажатие уходит, последующие — нет"""
+
+    def __init__(self, owner: FastAckMiddleware):
+        self.owner = owner
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, AnswerCallbackQuery):
+            answered = self.owner._answered
+            query_id = method.callback_query_id
+            if answered.get(query_id):
+                self.owner.late_answers += 1
+                return True
+            if query_id in answered:
+                answered[query_id] = True
+        return await make_request(bot, method)
+
+
+class CallbackDedupMiddleware(BaseMiddleware):
+    """Двойное нажатие одной кнопки обрабатывается один раз.
+
+    Ключ — (пользователь, callback data, сообщение с кнопкой). Пока нажатие
+    обрабатывается и ещё DEDUP_WINDOW секунд после, повтор только получает
+    пустой answer — без записей в БД и рассылок. Если хендлер упал, ключ
+    сразу освобождается: повторное нажатие — это повтор попытки.
+    Ставится outer-middleware на dp.callback_query раньше FastAckMiddleware.
+    """
+
+    def __init__(self, window: float = DEDUP_WINDOW):
+        self.window = window
+        self._running: set[tuple] = set()
+        self._done: OrderedDict[tuple, float] = OrderedDict()  # key -> до какого момента глушить
+        self.collapsed = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, CallbackQuery):
+            return await handler(event, data)
+
+        now = time.monotonic()
+        # окно у всех одинаковое, поэтому _done упорядочен по времени истечения
+        while self._done and next(iter(self._done.values())) <= now:
+            self._done.popitem(last=False)
+
+        key = (event.from_user.id, event.data, event.message.message_id if event.message else event.inline_message_id)
+        if key in self._running or key in self._done:
+            self.collapsed += 1
+            try:
+                await event.answer()
+            except TelegramBadRequest:
+                pass
+            return None
+
+        self._running.add(key)
+        try:
+            result = await handler(event, data)
+        finally:
+            self._running.discard(key)
+        self._done[key] = time.monotonic() + self.window
+        self._done.move_to_end(key)
+        return result
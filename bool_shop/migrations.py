@@ -0,0 +1,421 @@
+"""Версионные миграции схемы.
+
+Номер применённой миграции хранится в ``PRAGMA user_version``.
+Миграция N — это MIGRATIONS[N - 1]: кортеж SQL-выражений, которые
+выполняются одной транзакцией вместе с повышением user_version.
+Новые миграции только дописываются в конец списка.
+"""
+from bool_shop.money import parse_price
+
+MIGRATIONS = [
+    # 1: базовые таблицы (IF NOT EXISTS — для баз, созданных до миграций)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            tg_id BIGINT PRIMARY KEY NOT NULL,
+            username TEXT NOT NULL,
+            buyer BOOLEAN NOT NULL DEFAULT 0,
+            active_slots INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS slots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            png TEXT NOT NULL,
+            size TEXT,
+            price TEXT NOT NULL,
+            user_id BIGINT,
+            description TEXT,
+            channel_id BIGINT,
+            message_id BIGINT,
+            FOREIGN KEY (user_id) REFERENCES users (tg_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id BIGINT NOT NULL,
+            username TEXT,
+            slot_id INTEGER NOT NULL,
+            size TEXT,
+            delivery TEXT,
+            address TEXT,
+            proof TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (slot_id) REFERENCES slots (id)
+        )
+        """,
+    ),
+    # 2: покрывающие индексы под запросы из db.py
+    (
+        # get_user_orders: WHERE user_id = ? ORDER BY created_at DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_user_created
+            ON orders (user_id, created_at, slot_id, size, address, status)
+        """,
+        # get_orders_page(active=True): WHERE status IN (...) ORDER BY created_at DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_status_created
+            ON orders (status, created_at, user_id, slot_id)
+        """,
+        # get_orders_page(): ORDER BY created_at DESC без фильтра
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_created
+            ON orders (created_at, user_id, slot_id, size, status)
+        """,
+        # LEFT JOIN в get_users_page
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_user_status
+            ON orders (user_id, status)
+        """,
+        # get_user_slots: WHERE user_id = ?
+        """
+        CREATE INDEX IF NOT EXISTS idx_slots_user
+            ON slots (user_id, name, price)
+        """,
+    ),
+    # 3: остатки по размерам вместо строки slots.size
+    (
+        """
+        CREATE TABLE IF NOT EXISTS slot_sizes (
+            slot_id INTEGER NOT NULL,
+            size TEXT NOT NULL,
+            qty INTEGER NOT NULL DEFAULT 0 CHECK (qty >= 0),
+            PRIMARY KEY (slot_id, size),
+            FOREIGN KEY (slot_id) REFERENCES slots (id)
+        )
+        """,
+        # разбираем "40, 41,42" из slots.size, порядок размеров сохраняется через rowid
+        """
+        WITH RECURSIVE split(slot_id, pos, part, rest) AS (
+            SELECT id, 0, NULL, size || ',' FROM slots WHERE size IS NOT NULL AND size != ''
+            UNION ALL
+            SELECT slot_id, pos + 1,
+                   TRIM(substr(rest, 1, instr(rest, ',') - 1)),
+                   substr(rest, instr(rest, ',') + 1)
+            FROM split WHERE rest != ''
+        )
+        INSERT OR IGNORE INTO slot_sizes (slot_id, size, qty)
+        SELECT slot_id, part, COUNT(*) FROM split
+        WHERE part IS NOT NULL AND part != ''
+        GROUP BY slot_id, part
+        ORDER BY slot_id, MIN(pos)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS slots_delete_sizes AFTER DELETE ON slots
+        BEGIN
+            DELETE FROM slot_sizes WHERE slot_id = OLD.id;
+        END
+        """,
+    ),
+    # 4: users.active_slots ведут триггеры по переходам статуса заказа
+    (
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_insert AFTER INSERT ON orders
+        WHEN NEW.status IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = active_slots + 1 WHERE tg_id = NEW.user_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_delete AFTER DELETE ON orders
+        WHEN OLD.status IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = MAX(active_slots - 1, 0) WHERE tg_id = OLD.user_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_on AFTER UPDATE OF status ON orders
+        WHEN NEW.status IN ('paid', 'processing', 'shipped')
+         AND OLD.status NOT IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = active_slots + 1 WHERE tg_id = NEW.user_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_off AFTER UPDATE OF status ON orders
+        WHEN OLD.status IN ('paid', 'processing', 'shipped')
+         AND NEW.status NOT IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = MAX(active_slots - 1, 0) WHERE tg_id = NEW.user_id;
+        END
+        """,
+        # разовая сверка: счётчик, который вёлся вручную, расходился с отчётами
+        """
+        UPDATE users SET active_slots = (
+            SELECT COUNT(*) FROM orders o
+            WHERE o.user_id = users.tg_id
+              AND o.status IN ('paid', 'processing', 'shipped')
+        )
+        """,
+        # отчёты больше не джойнят orders
+        "DROP INDEX IF EXISTS idx_orders_user_status",
+        "CREATE INDEX IF NOT EXISTS idx_users_buyer ON users (buyer, tg_id)",
+    ),
+    # 5: orders.created_at — UTC epoch (INTEGER) вместо текста CURRENT_TIMESTAMP.
+    # Пересоздаём таблицу, чтобы сменить DEFAULT; индексы и триггеры
+    # удаляются вместе со старой таблицей и создаются заново.
+    (
+        """
+        CREATE TABLE orders_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id BIGINT NOT NULL,
+            username TEXT,
+            slot_id INTEGER NOT NULL,
+            size TEXT,
+            delivery TEXT,
+            address TEXT,
+            proof TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            FOREIGN KEY (slot_id) REFERENCES slots (id)
+        )
+        """,
+        # CURRENT_TIMESTAMP писал UTC, так что strftime('%s', ...) даёт верный epoch
+        """
+        INSERT INTO orders_new (id, user_id, username, slot_id, size, delivery, address, proof, status, created_at)
+        SELECT id, user_id, username, slot_id, size, delivery, address, proof, status,
+               CASE typeof(created_at)
+                   WHEN 'integer' THEN created_at
+                   ELSE COALESCE(CAST(strftime('%s', created_at) AS INTEGER), 0)
+               END
+        FROM orders
+        """,
+        # не даём AUTOINCREMENT переиспользовать id удалённых заказов
+        """
+        UPDATE sqlite_sequence
+        SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('orders', 'orders_new'))
+        WHERE name = 'orders_new'
+        """,
+        """
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'orders_new', seq FROM sqlite_sequence
+        WHERE name = 'orders'
+          AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'orders_new')
+        """,
+        "DROP TABLE orders",
+        "ALTER TABLE orders_new RENAME TO orders",
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_user_created
+            ON orders (user_id, created_at, slot_id, size, address, status)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_status_created
+            ON orders (status, created_at, user_id, slot_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_created
+            ON orders (created_at, user_id, slot_id, size, status)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_insert AFTER INSERT ON orders
+        WHEN NEW.status IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = active_slots + 1 WHERE tg_id = NEW.user_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_delete AFTER DELETE ON orders
+        WHEN OLD.status IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = MAX(active_slots - 1, 0) WHERE tg_id = OLD.user_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_on AFTER UPDATE OF status ON orders
+        WHEN NEW.status IN ('paid', 'processing', 'shipped')
+         AND OLD.status NOT IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = active_slots + 1 WHERE tg_id = NEW.user_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS orders_active_off AFTER UPDATE OF status ON orders
+        WHEN OLD.status IN ('paid', 'processing', 'shipped')
+         AND NEW.status NOT IN ('paid', 'processing', 'shipped')
+        BEGIN
+            UPDATE users SET active_slots = MAX(active_slots - 1, 0) WHERE tg_id = NEW.user_id;
+        END
+        """,
+    ),
+    # 6: slots.price — целые копейки вместо текста ("1 500", "1500₽", "1499,90")
+    (
+        "DROP INDEX IF EXISTS idx_slots_user",
+        "ALTER TABLE slots ADD COLUMN price_kop INTEGER NOT NULL DEFAULT 0",
+        # parse_price — money.parse_price, см. migrate(): неразборчивая цена валит миграцию
+        "UPDATE slots SET price_kop = parse_price(price)",
+        "ALTER TABLE slots DROP COLUMN price",
+        "ALTER TABLE slots RENAME COLUMN price_kop TO price",
+        """
+        CREATE INDEX IF NOT EXISTS idx_slots_user
+            ON slots (user_id, name, price)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_slots_price ON slots (price)",
+    ),
+    # 7: архив завершённых заказов (переносит db.archive_orders)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS orders_archive (
+            id INTEGER PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            username TEXT,
+            slot_id INTEGER NOT NULL,
+            size TEXT,
+            delivery TEXT,
+            address TEXT,
+            proof TEXT,
+            status TEXT,
+            created_at INTEGER NOT NULL,
+            archived_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_archive_user_created
+            ON orders_archive (user_id, created_at, slot_id, size, address, status)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_archive_created
+            ON orders_archive (created_at, user_id, slot_id, size, status)
+        """,
+    ),
+    # 8: полнотекстовый поиск по каталогу (name + хэштеги в description)
+    (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS slots_fts USING fts5(
+            name, description,
+            content='slots', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS slots_fts_insert AFTER INSERT ON slots
+        BEGIN
+            INSERT INTO slots_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS slots_fts_delete AFTER DELETE ON slots
+        BEGIN
+            INSERT INTO slots_fts (slots_fts, rowid, name, description)
+            VALUES ('delete', OLD.id, OLD.name, OLD.description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS slots_fts_update AFTER UPDATE OF name, description ON slots
+        BEGIN
+            INSERT INTO slots_fts (slots_fts, rowid, name, description)
+            VALUES ('delete', OLD.id, OLD.name, OLD.description);
+            INSERT INTO slots_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+        END
+        """,
+        "INSERT INTO slots_fts (slots_fts) VALUES ('rebuild')",
+    ),
+    # 9: состояние FSM (оформление заказа, добавление слота) переживает перезапуск
+    (
+        """
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state (updated_at)",
+    ),
+    # 10: outbox — уведомления пишутся в одной транзакции со сменой статуса заказа
+    (
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id BIGINT NOT NULL,
+            text TEXT,
+            photo TEXT,
+            reply_markup TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_at REAL NOT NULL DEFAULT 0,
+            created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_next ON outbox (next_at)",
+        # порядок сообщений одному чату: get_outbox не отдаёт обгоняющие
+        "CREATE INDEX IF NOT EXISTS idx_outbox_chat ON outbox (chat_id, id, next_at)",
+    ),
+    # 11: ключ идемпотентности — повтор создания заказа возвращает уже созданный
+    (
+        "ALTER TABLE orders ADD COLUMN idempotency_key TEXT",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency
+            ON orders (idempotency_key) WHERE idempotency_key IS NOT NULL
+        """,
+    ),
+    # 12: бронь размера с момента создания заказа; неоплаченная бронь истекает
+    (
+        # reserved — заказ держит единицу своего размера, reserved_until — до какого момента (NULL — без срока)
+        "ALTER TABLE orders ADD COLUMN reserved INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE orders ADD COLUMN reserved_until INTEGER",
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_reserved_until
+            ON orders (reserved_until) WHERE status = 'pending' AND reserved = 1
+        """,
+    ),
+    # 13: цена на заказе — выручка не меняется при правке цены или удалении слота
+    (
+        "ALTER TABLE orders ADD COLUMN price INTEGER",
+        "ALTER TABLE orders_archive ADD COLUMN price INTEGER",
+        "UPDATE orders SET price = (SELECT price FROM slots WHERE slots.id = orders.slot_id)",
+        "UPDATE orders_archive SET price = (SELECT price FROM slots WHERE slots.id = orders_archive.slot_id)",
+    ),
+    # 14: индекс броней с колонками своего предиката. С одним reserved_until
+    # планировщик предпочитал idx_orders_status_created (status=?) и перебирал
+    # все pending-заказы; теперь условие чистильщика целиком ложится в индекс
+    (
+        "DROP INDEX IF EXISTS idx_orders_reserved_until",
+        """
+        CREATE INDEX IF NOT EXISTS idx_orders_reserved_until
+            ON orders (status, reserved, reserved_until) WHERE status = 'pending' AND reserved = 1
+        """,
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _parse_legacy_price(text) -> int:
+    try:
+        return parse_price(str(text))
+    except ValueError:
+        # sqlite3 не передаёт текст исключения из функции — печатаем сами
+        print(f"❌ Не удалось перевести цену слота {text!r} в копейки: исправьте её вручную")
+        raise
+
+
+async def get_version(db) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def migrate(db) -> int:
+    """Применяет недостающие миграции; если схема актуальна — ничего не выполняет.
+
+    ``db`` — соединение писателя в режиме autocommit (isolation_level=None).
+    """
+    version = await get_version(db)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    await db.create_function("parse_price", 1, _parse_legacy_price, deterministic=True)
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in MIGRATIONS[number - 1]:
+                await db.execute(statement)
+            await db.execute(f"PRAGMA user_version = {number}")
+            await db.execute("COMMIT")
+        except Exception:
+            await db.execute("ROLLBACK")
+            raise
+        print(f"🛠 Применена миграция {number}")
+    return SCHEMA_VERSION
@@ -0,0 +1,75 @@
+class Record:
+    """Компактная запись строки БД на __slots__.
+
+    Поля читаются как атрибуты (``slot.name``), а для старого кода работают
+    ``slot["name"]`` и ``slot.get("name")``.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"{type(self).__name__}: неизвестные поля {', '.join(fields)}")
+
+    @classmethod
+    def factory(cls, *columns):
+        """row_factory для курсора: columns — порядок колонок в SELECT.
+
+        Маппинг колонок строится один раз, при создании фабрики;
+        поля, которых нет в запросе, заполняются None.
+        """
+        columns = columns or cls.__slots__
+        missing = tuple(name for name in cls.__slots__ if name not in columns)
+        new = object.__new__
+
+        def make(cursor, row):
+            obj = new(cls)
+            for name, value in zip(columns, row):
+                setattr(obj, name, value)
+            for name in missing:
+                setattr(obj, name, None)
+            return obj
+
+        return make
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Slot(Record):
+    # price — целое число копеек, см. bool_shop.money
+    __slots__ = ("id", "name", "png", "price", "description", "user_id", "channel_id", "message_id", "sizes")
+
+    @property
+    def size(self) -> str:
+        """размеры строкой через запятую, как раньше хранилось в slots.size"""
+        return ",".join(self.sizes or ())
+
+
+class Order(Record):
+    __slots__ = ("id", "user_id", "username", "size", "delivery", "address", "status",
+                 "proof", "slot_id", "slot_name", "price", "created_at", "reserved")
+
+
+class User(Record):
+    __slots__ = ("tg_id", "username", "buyer", "active_slots")
+
+
+class Notification(Record):
+    # reply_markup — JSON клавиатуры; photo задано — уходит send_photo с text в подписи
+    __slots__ = ("id", "chat_id", "text", "photo", "reply_markup", "attempts", "next_at")
@@ -0,0 +1,29 @@
+from decimal import Decimal, InvalidOperation
+
+# Деньги храним целым числом копеек: SQL может их суммировать и сравнивать.
+
+
+def parse_price(text: str) -> int:
+    """'1500', '1 500₽', '1499.90', '1499,9' -> копейки; ValueError, если это не цена"""
+    cleaned = (
+        text.replace("₽", "")
+        .replace("руб", "")
+        .replace(" ", "")
+        .replace("\u00a0", "")
+        .replace(",", ".")
+        .rstrip(".")
+    )
+    try:
+        value = Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"not a price: {text!r}") from None
+    if not value.is_finite() or value <= 0 or value.as_tuple().exponent < -2:
+        raise ValueError(f"not a price: {text!r}")
+    return int(value * 100)
+
+
+def format_price(kopecks: int) -> str:
+    """150000 -> '1 500', 149990 -> '1 499.90'"""
+    rub, kop = divmod(kopecks, 100)
+    text = f"{rub:,}".replace(",", " ")
+    return f"{text}.{kop:02d}" if kop else text
@@ -0,0 +1,133 @@
+"""Outbox: уведомления покупателям и админам уходят не из хендлера.
+
+Хендлер передаёт уведомления в метод заказа (``notify=...``), и они
+записываются в таблицу outbox той же транзакцией, что и смена статуса:
+либо заказ изменился и уведомление гарантированно уйдёт (даже если бот
+упадёт сразу после коммита), либо не случилось ни того, ни другого.
+Хендлер отвечает после одного коммита, без round trip'ов в Telegram.
+
+OutboxSender забирает уведомления пачками и шлёт их параллельно по чатам
+(в одном чате — по порядку) через bot, то есть через RateLimiter сессии.
+Сетевые ошибки и исчерпанные 429 повторяются с экспоненциальной паузой;
+«бот заблокирован» и прочие 4xx не повторяются. Доставка — at-least-once:
+если упасть между отправкой и удалением строки, сообщение уйдёт повторно.
+"""
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+from aiogram.types import InlineKeyboardMarkup
+
+from bool_shop.bot_token import ADMINS
+from bool_shop.models import Notification
+from bool_shop.repository import Repository
+
+OUTBOX_BATCH = 100
+OUTBOX_POLL = 5.0  # сек: страховка, если пробуждение пропущено
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF = 2.0  # сек, удваивается с каждой неудачной попыткой
+OUTBOX_BACKOFF_MAX = 300.0
+
+
+def message(chat_id: int, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> Notification:
+    return Notification(
+        chat_id=chat_id, text=text,
+        reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+    )
+
+
+def photo(chat_id: int, file_id: str, caption: str, reply_markup: InlineKeyboardMarkup | None = None) -> Notification:
+    notification = message(chat_id, caption, reply_markup)
+    notification.photo = file_id
+    return notification
+
+
+def to_admins(text: str, reply_markup: InlineKeyboardMarkup | None = None,
+              file_id: str | None = None) -> list[Notification]:
+    if file_id:
+        return [photo(admin_id, file_id, text, reply_markup) for admin_id in ADMINS]
+    return [message(admin_id, text, reply_markup) for admin_id in ADMINS]
+
+
+class OutboxSender:
+    def __init__(self, bot, repo: Repository, batch: int = OUTBOX_BATCH, poll: float = OUTBOX_POLL,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.bot = bot
+        self.repo = repo
+        self.batch = batch
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+
+    async def run(self):
+        ready = self.repo.outbox_ready
+        while True:
+            # сбрасываем до чтения: запись во время отправки разбудит следующий круг
+            ready.clear()
+            try:
+                taken = await self.drain()
+            except Exception as e:
+                print(f"Ошибка отправки outbox: {e}")
+                taken = 0
+            if taken >= self.batch:
+                continue
+            try:
+                await asyncio.wait_for(ready.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self) -> int:
+        """Одна пачка: отправить, удалить доставленное, отложить неудачное"""
+        items = await self.repo.get_outbox(time.time(), self.batch)
+        if not items:
+            return 0
+
+        chats: dict[int, list[Notification]] = {}
+        for item in items:
+            chats.setdefault(item.chat_id, []).append(item)
+        results = await asyncio.gather(*(self._send_chat(chain) for chain in chats.values()))
+
+        done = [i for chat_done, _ in results for i in chat_done]
+        retries = [r for _, chat_retries in results for r in chat_retries]
+        await self.repo.ack_outbox(done)
+        await self.repo.retry_outbox(retries)
+        return len(items)
+
+    async def _send_chat(self, chain: list[Notification]):
+        done, retries = [], []
+        for position, item in enumerate(chain):
+            try:
+                await self._send(item)
+            except (TelegramForbiddenError, TelegramNotFound, TelegramBadRequest) as e:
+                # повтор не поможет: бот заблокирован, чат не найден, запрос неверен
+                print(f"Уведомление #{item.id} для {item.chat_id} не доставлено: {e}")
+                self.dropped += 1
+                done.append(item.id)
+            except Exception as e:
+                if item.attempts + 1 >= self.max_attempts:
+                    print(f"Уведомление #{item.id} для {item.chat_id} отброшено после {self.max_attempts} попыток: {e}")
+                    self.dropped += 1
+                    done.append(item.id)
+                    continue
+                self.retried += 1
+                next_at = time.time() + min(OUTBOX_BACKOFF * 2 ** item.attempts, OUTBOX_BACKOFF_MAX)
+                retries.append((item.id, next_at, True))
+                # следующие сообщения этому чату ждут вместе с ним, чтобы не обогнать
+                retries.extend((later.id, next_at, False) for later in chain[position + 1:])
+                break
+            else:
+                self.sent += 1
+                done.append(item.id)
+        return done, retries
+
+    async def _send(self, item: Notification):
+        markup = InlineKeyboardMarkup.model_validate_json(item.reply_markup) if item.reply_markup else None
+        if item.photo:
+            await self.bot.send_photo(item.chat_id, item.photo, caption=item.text, reply_markup=markup)
+        else:
+            await self.bot.send_message(item.chat_id, item.text, reply_markup=markup)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "dropped": self.dropped}
@@ -0,0 +1,202 @@
+"""Интерфейс хранилища: пользователи, слоты, заказы, отчёты.
+
+Хендлеры не импортируют функции БД напрямую — они получают объект
+``repo`` через workflow data диспетчера (``Dispatcher(repo=...)``) и
+работают с ним через этот интерфейс. Реализации:
+
+* ``bool_shop.db.SQLiteRepository`` — боевая, SQLite в режиме WAL;
+* ``bool_shop.memory.MemoryRepository`` — всё в словарях процесса,
+  для тестов и нагрузочных прогонов хендлеров без диска.
+
+Цены — целые копейки, время — UTC epoch (секунды).
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
+
+from bool_shop.models import Notification, Order
+
+PAGE_SIZE = 15
+ARCHIVE_AFTER_DAYS = 30  # выполненные/отменённые заказы старше этого уезжают в архив
+ARCHIVE_INTERVAL = 3600  # сек
+RESERVATION_TTL = 30 * 60  # сек на оплату, пока размер держится за заказом
+RESERVATION_INTERVAL = 60  # сек между проходами чистильщика броней
+RESERVATION_BATCH = 500
+ACTIVE_STATUSES = ("paid", "processing", "shipped")
+TERMINAL_STATUSES = ("completed", "rejected", "declined", "expired")
+# заказ в этом статусе возвращает забронированный размер на склад
+RELEASE_STATUSES = ("rejected", "declined", "expired")
+
+
+def order_key(order: Order) -> tuple:
+    """ключ keyset-пагинации заказов"""
+    return order.created_at, order.id
+
+
+class Repository(ABC):
+    _outbox_ready: asyncio.Event | None = None
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def cache_stats(self) -> dict | None:
+        """статистика кэша слотов, если он есть"""
+        return None
+
+    @property
+    def outbox_ready(self) -> asyncio.Event:
+        """взводится после каждой записи в outbox — будит OutboxSender"""
+        if self._outbox_ready is None:
+            self._outbox_ready = asyncio.Event()
+        return self._outbox_ready
+
+    # ================= USERS =================
+
+    @abstractmethod
+    async def add_user(self, user): ...
+
+    @abstractmethod
+    async def get_users(self): ...
+
+    @abstractmethod
+    async def mark_as_buyer(self, tg_id: int): ...
+
+    @abstractmethod
+    async def get_all_users(self): ...
+
+    # ================= SLOTS =================
+
+    @abstractmethod
+    async def add_slot(self, name: str, png: str, sizes: list[str], price: int, user_id: int,
+                       description: str = None) -> int: ...
+
+    @abstractmethod
+    async def set_slot_sizes(self, slot_id: int, sizes: list[str]): ...
+
+    @abstractmethod
+    async def update_slot_size(self, slot_id: int, new_size: str) -> bool: ...
+
+    @abstractmethod
+    async def reserve_size(self, slot_id: int, size: str) -> bool: ...
+
+    @abstractmethod
+    async def save_slot_post(self, slot_id: int, channel_id: int, message_id: int): ...
+
+    @abstractmethod
+    async def get_slots(self): ...
+
+    @abstractmethod
+    async def get_slot(self, slot_id: int): ...
+
+    @abstractmethod
+    async def update_slot(self, slot_id: int, field: str, value): ...
+
+    @abstractmethod
+    async def get_user_slots(self, user_id: int): ...
+
+    @abstractmethod
+    async def delete_slot(self, slot_id: int): ...
+
+    @abstractmethod
+    async def reset_slots(self): ...
+
+    # ================= ORDERS =================
+
+    @abstractmethod
+    async def create_order(self, user_id: int, slot_id: int, username: str | None = None,
+                           size: str | None = None, delivery: str | None = None,
+                           address: str | None = None, idempotency_key: str | None = None,
+                           reserve_for: int | None = None) -> int | None:
+        """idempotency_key: повтор с тем же ключом вернёт id уже созданного заказа.
+
+        reserve_for: в той же транзакции списать единицу размера и держать её
+        reserve_for секунд; если размера нет — заказ не создаётся, вернётся None.
+        """
+
+    @abstractmethod
+    async def get_order_user(self, order_id: int): ...
+
+    @abstractmethod
+    async def update_order_address(self, order_id: int, address: str, status: str | None = None,
+                                   notify: Iterable[Notification] = ()) -> bool: ...
+
+    @abstractmethod
+    async def update_order_delivery(self, order_id: int, delivery: str, status: str | None = None,
+                                    notify: Iterable[Notification] = ()) -> bool: ...
+
+    @abstractmethod
+    async def decline_order(self, order_id: int, notify: Iterable[Notification] = ()) -> bool: ...
+
+    @abstractmethod
+    async def update_order_status(self, order_id: int, status: str, notify: Iterable[Notification] = ()) -> bool: ...
+
+    @abstractmethod
+    async def add_order_proof(self, order_id: int, proof_file_id: str, notify: Iterable[Notification] = ()) -> bool: ...
+
+    @abstractmethod
+    async def get_user_orders(self, user_id: int): ...
+
+    @abstractmethod
+    async def get_order(self, order_id: int) -> Order | None: ...
+
+    # Методы выше, меняющие заказ, возвращают, изменился ли он: повтор с теми же
+    # значениями ничего не пишет (и его notify не отправляется). Переход в
+    # RELEASE_STATUSES той же транзакцией возвращает бронь на склад.
+    # add_order_proof принимает чек только у заказа в pending и снимает срок брони.
+
+    @abstractmethod
+    async def expire_reservations(self, now: int, limit: int = RESERVATION_BATCH,
+                                  notify: Callable[[Order], Notification] | None = None) -> set[int]:
+        """Просроченные pending-заказы → expired, размеры — обратно на склад.
+        Возвращает id слотов, у которых изменился остаток"""
+
+    # ================= OUTBOX =================
+    # notify в методах заказов — уведомления, которые попадают в outbox той же
+    # транзакцией, что и изменение заказа; отправляет их OutboxSender.
+
+    @abstractmethod
+    async def get_outbox(self, now: float, limit: int) -> list[Notification]:
+        """уведомления, которым пора уйти, по порядку; сообщение не обгоняет
+        отложенное (после ошибки) более раннее сообщение тому же чату"""
+
+    @abstractmethod
+    async def ack_outbox(self, ids: list[int]): ...
+
+    @abstractmethod
+    async def retry_outbox(self, retries: list[tuple[int, float, bool]]):
+        """(id, когда повторить, считать ли попытку неудачной)"""
+
+    # ================= REPORTS =================
+
+    @abstractmethod
+    async def get_orders_page(self, active: bool = False, after: tuple | None = None,
+                              before: tuple | None = None, limit: int = PAGE_SIZE): ...
+
+    @abstractmethod
+    async def get_users_page(self, buyers_only: bool = False, after: int | None = None,
+                             before: int | None = None, limit: int = PAGE_SIZE): ...
+
+    @abstractmethod
+    async def get_revenue(self, since: int = 0): ...
+
+    @abstractmethod
+    async def get_price_range(self): ...
+
+    @abstractmethod
+    async def search_slots(self, text: str, offset: int = 0, limit: int = PAGE_SIZE): ...
+
+    # ================= ARCHIVE =================
+
+    @abstractmethod
+    async def archive_orders(self, older_than: int, batch_size: int = 500) -> int: ...
+
+
+async def archive_old_orders(repo: Repository) -> int:
+    """Фоновая задача: переносит старые закрытые заказы из горячей таблицы в архив"""
+    moved = await repo.archive_orders(ARCHIVE_AFTER_DAYS * 86400)
+    if moved:
+        print(f"🗄 В архив перенесено заказов: {moved}")
+    return moved
@@ -0,0 +1,34 @@
+"""Снятие просроченных броней.
+
+Заказ с момента выбора размера держит единицу этого размера (см.
+Repository.create_order(reserve_for=...)). Если чек не пришёл за
+RESERVATION_TTL, чистильщик пачками переводит такие заказы в expired,
+возвращает размеры на склад одной транзакцией на пачку, пишет покупателю
+через outbox и один раз на слот обновляет подпись поста в канале.
+"""
+import time
+
+import bool_shop.outbox as outbox
+from bool_shop.channel import CaptionDebouncer
+from bool_shop.models import Notification, Order
+from bool_shop.repository import Repository
+
+
+def expired_notification(order: Order) -> Notification:
+    return outbox.message(
+        order.user_id,
+        f"⌛ Бронь по заказу #{order.id} истекла: оплата не пришла вовремя.\n"
+        f"Если товар ещё нужен, оформите заказ заново."
+    )
+
+
+async def release_expired(repo: Repository, captions: CaptionDebouncer) -> int:
+    """Один проход: все просроченные брони, пачка за пачкой. Возвращает число слотов"""
+    slot_ids = set()
+    while released := await repo.expire_reservations(int(time.time()), notify=expired_notification):
+        slot_ids |= released
+    for slot_id in slot_ids:
+        captions.schedule(slot_id)
+    if slot_ids:
+        print(f"⌛ Сняты просроченные брони, обновлено слотов: {len(slot_ids)}")
+    return len(slot_ids)
@@ -0,0 +1,236 @@
+"""Планировщик фоновых задач внутри процесса бота.
+
+Задача — корутина без аргументов. Запускается по интервалу
+(``every``), по cron-выражению (``cron``) или один раз после старта
+(``once``). К каждому сроку добавляется случайная пауза до jitter секунд,
+чтобы тяжёлые задачи не просыпались одновременно. Если прошлый запуск
+ещё идёт, очередной пропускается — задача никогда не работает в две копии.
+Ошибка задачи печатается и попадает в метрики, расписание не ломается.
+
+Scheduler стартует и останавливается хуками диспетчера (dp.startup /
+dp.shutdown). stop() больше не запускает новые задачи и ждёт уже
+запущенные до drain_timeout секунд, поэтому БД закрывается только после них.
+"""
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+
+SCHEDULER_DRAIN_TIMEOUT = 30.0  # сек: сколько ждём запущенные задачи при остановке
+CRON_HORIZON_DAYS = 5 * 366  # дальше не ищем: выражение вроде «31 февраля» не сработает никогда
+
+
+class CronSpec:
+    """«минута час день месяц день_недели»: *, */n, a-b, a-b/n, списки через запятую.
+
+    День недели 0–6, 0 (и 7) — воскресенье. Как в cron: если заданы и день
+    месяца, и день недели, подходит любой из них. Время — локальное время сервера.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, spec: str):
+        parts = spec.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron: нужно 5 полей, а в {spec!r} их {len(parts)}")
+        self.spec = spec
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+        self.next_after(datetime.now())  # невыполнимое выражение — ошибка сразу, а не в цикле
+
+    def _parse(self, field: str, low: int, high: int) -> frozenset[int]:
+        values = set()
+        for item in field.split(","):
+            span, _, step = item.partition("/")
+            try:
+                step = int(step) if step else 1
+                if span == "*":
+                    start, end = low, high
+                elif "-" in span:
+                    start, end = map(int, span.split("-", 1))
+                else:
+                    # «5/15» — с пятой и дальше через 15
+                    start = int(span)
+                    end = high if step > 1 else start
+            except ValueError:
+                raise ValueError(f"cron: не разобрать {item!r} в {self.spec!r}") from None
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"cron: {item!r} вне диапазона {low}-{high} в {self.spec!r}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        weekday = (moment.weekday() + 1) % 7  # у datetime понедельник — 0, у cron воскресенье — 0
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday in self.weekdays
+        if self.any_weekday:
+            return moment.day in self.days
+        return moment.day in self.days or weekday in self.weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Ближайшая подходящая минута строго после moment"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        horizon = moment + timedelta(days=CRON_HORIZON_DAYS)
+        while moment < horizon:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"cron: {self.spec!r} никогда не срабатывает")
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: float | None = None,
+                 cron: CronSpec | None = None, jitter: float = 0.0, at_start: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.at_start = at_start
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_run: float | None = None  # epoch
+        self.next_run: float | None = None  # epoch
+        self.last_error: str | None = None
+        self.task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def delay(self) -> float | None:
+        """Секунд до следующего срока без jitter; None — разовая задача"""
+        if self.cron is not None:
+            now = datetime.now()
+            return max(0.0, (self.cron.next_after(now) - now).total_seconds())
+        return self.interval
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "schedule": self.cron.spec if self.cron else f"every {self.interval:g}s" if self.interval else "once",
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration": self.last_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else 0.0,
+            "max_duration": self.max_duration,
+            "last_run": self.last_run,
+            "next_run": self.next_run,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    def __init__(self, drain_timeout: float = SCHEDULER_DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.jobs: dict[str, Job] = {}
+        self._loops: list[asyncio.Task] = []
+        self._running: set[asyncio.Task] = set()
+
+    def every(self, name: str, interval: float, func: Callable[[], Awaitable],
+              jitter: float = 0.0, at_start: bool = False) -> Job:
+        """Раз в interval секунд (+ до jitter); at_start — первый запуск сразу после старта"""
+        if interval <= 0:
+            raise ValueError(f"Интервал задачи {name} должен быть больше нуля")
+        return self._add(Job(name, func, interval=interval, jitter=jitter, at_start=at_start))
+
+    def cron(self, name: str, spec: str, func: Callable[[], Awaitable], jitter: float = 0.0) -> Job:
+        return self._add(Job(name, func, cron=CronSpec(spec), jitter=jitter))
+
+    def once(self, name: str, func: Callable[[], Awaitable], jitter: float = 0.0) -> Job:
+        return self._add(Job(name, func, jitter=jitter, at_start=True))
+
+    def _add(self, job: Job) -> Job:
+        if job.name in self.jobs:
+            raise ValueError(f"Задача {job.name} уже зарегистрирована")
+        self.jobs[job.name] = job
+        if self._loops:
+            self._loops.append(asyncio.create_task(self._loop(job)))
+        return job
+
+    async def start(self):
+        if self._loops:
+            return
+        self._loops = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+        print(f"⏰ Планировщик запущен, задач: {len(self._loops)}")
+
+    async def _loop(self, job: Job):
+        if job.at_start:
+            await self._sleep(job, 0.0)
+            self._launch(job)
+        while (delay := job.delay()) is not None:
+            await self._sleep(job, delay)
+            self._launch(job)
+        job.next_run = None
+
+    async def _sleep(self, job: Job, delay: float):
+        delay += random.uniform(0, job.jitter)
+        job.next_run = time.time() + delay
+        await asyncio.sleep(delay)
+
+    def _launch(self, job: Job):
+        if job.running:
+            job.skipped += 1
+            print(f"⏭ Задача {job.name} ещё выполняется, запуск пропущен")
+            return
+        job.task = asyncio.create_task(self._execute(job))
+        self._running.add(job.task)
+        job.task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job: Job):
+        job.last_run = time.time()
+        started = time.perf_counter()
+        try:
+            await job.func()
+        except Exception as e:
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            print(f"Ошибка фоновой задачи {job.name}: {e}")
+        finally:
+            duration = time.perf_counter() - started
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+
+    async def stop(self):
+        """Новые запуски прекращаются, запущенные задачи дорабатывают до drain_timeout"""
+        loops, self._loops = self._loops, []
+        for loop in loops:
+            loop.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        for job in self.jobs.values():
+            job.next_run = None
+        if not self._running:
+            return
+        names = ", ".join(job.name for job in self.jobs.values() if job.running)
+        print(f"⏳ Ждём фоновые задачи: {names}")
+        _, pending = await asyncio.wait(set(self._running), timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if pending:
+            print(f"⚠ Не дождались фоновых задач: {len(pending)}, прерваны")
+
+    def stats(self) -> list[dict]:
+        return [job.stats() for job in self.jobs.values()]
@@ -29,3 +29,6 @@ class AddSlot(StatesGroup):
     waiting_sizes = State()
     waiting_description = State()
 
+
+class SearchFSM(StatesGroup):
+    waiting_query = State()
@@ -0,0 +1,149 @@
+"""Исходящий rate limit для Bot API: middleware на сессии aiogram.
+
+Каждый запрос, который отправляет или редактирует сообщение, берёт токен
+из двух вёдер: общего на бота (~30 сообщений/с) и ведра своего чата
+(личка — ~1 сообщение/с, канал или группа — ~20 сообщений/мин). Ведро выдаёт
+токены «в долг»: запрос резервирует своё место в очереди и спит ровно
+до своего слота, поэтому порядок FIFO и поток держится на потолке лимита.
+
+Остальные методы (answerCallbackQuery, deleteMessage, setWebhook...) токены
+не берут, но, как и сообщения, повторяются на 429 и ограничены
+REQUEST_TIMEOUT; исключение — getUpdates, который сам держит long polling.
+На 429 (TelegramRetryAfter) общее ведро и ведро чата замораживаются на
+retry_after секунд — ждут все, кто идёт через них, — и запрос повторяется.
+"""
+import asyncio
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates
+
+GLOBAL_RATE = 30.0  # сообщений в секунду на бота
+GLOBAL_BURST = 5
+CHAT_RATE = 1.0  # личный чат
+CHAT_BURST = 2
+GROUP_RATE = 20 / 60  # группы и каналы (chat_id < 0)
+GROUP_BURST = 3
+REQUEST_TIMEOUT = 15.0  # сек на сам HTTP-вызов, без ожидания в очереди
+MAX_RETRIES = 3
+MAX_IDLE_BUCKETS = 10_000
+
+# лимиты Telegram считаются по сообщениям: отправка, пересылка, редактирование
+LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Забирает токен (можно в долг). Возвращает, сколько секунд ждать своего слота"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float):
+        """429: следующий токен появится не раньше, чем через seconds"""
+        self._refill(time.monotonic())
+        # следующий reserve() уйдёт в минус ровно на seconds * rate
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class RateLimiter(BaseRequestMiddleware):
+    def __init__(self, timeout: float = REQUEST_TIMEOUT, retries: int = MAX_RETRIES):
+        self.timeout = timeout
+        self.retries = retries
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self.chats: dict[int | str, TokenBucket] = {}
+        self.waiting = 0  # запросов ждут токен прямо сейчас
+        self.in_flight = 0
+        self.sent = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= MAX_IDLE_BUCKETS:
+                # забываем чаты, у которых ведро уже полное — они ничего не ждут
+                self.chats = {key: b for key, b in self.chats.items() if not b.idle}
+            # @username канала или отрицательный id — группа/канал
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(GROUP_RATE, GROUP_BURST) if group else TokenBucket(CHAT_RATE, CHAT_BURST)
+            self.chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_bucket: TokenBucket):
+        # резервируем оба ведра сразу и ждём дольшее — без await между резервами,
+        # так что очередь остаётся честной
+        delay = max(self.global_bucket.reserve(), chat_bucket.reserve())
+        if delay > 0:
+            self.max_wait = max(self.max_wait, delay)
+            self.waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.waiting -= 1
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            # long polling сам держит соединение timeout секунд и не лимитируется
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        limited = chat_id is not None and method.__api_method__.startswith(LIMITED_PREFIXES)
+        chat_bucket = self._chat_bucket(chat_id) if limited else None
+        attempt = 0
+        while True:
+            if limited:
+                await self._acquire(chat_bucket)
+            self.in_flight += 1
+            try:
+                response = await asyncio.wait_for(make_request(bot, method), self.timeout)
+            except TelegramRetryAfter as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                # Telegram не говорит, чей это лимит: замораживаем и чат, и бота целиком
+                self.global_bucket.pause(e.retry_after)
+                if limited:
+                    chat_bucket.pause(e.retry_after)
+                else:
+                    # вне вёдер ждать некому, кроме самого запроса
+                    await asyncio.sleep(e.retry_after)
+                continue
+            except asyncio.TimeoutError:
+                # не повторяем: запрос мог уже выполниться
+                self.timeouts += 1
+                raise
+            finally:
+                self.in_flight -= 1
+            self.sent += 1
+            return response
+
+    def stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "retried": self.retried,
+            "timeouts": self.timeouts,
+            "max_wait": self.max_wait,
+            "chats": len(self.chats),
+        }
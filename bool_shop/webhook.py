@@ -0,0 +1,136 @@
+"""Режим webhook: aiohttp-сервер вместо dp.start_polling.
+
+Хендлер запроса только сверяет секрет и кладёт сырой JSON апдейта в
+ограниченную очередь — Telegram сразу получает 200. Разбор и обработку
+делают WEBHOOK_WORKERS воркеров параллельно. Если очередь полна, отвечаем
+503: Telegram повторит доставку позже, а память процесса не растёт.
+
+Включается переменной BOOL_SHOP_WEBHOOK_URL (публичный https-адрес бота).
+"""
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+
+from aiohttp import web
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv("BOOL_SHOP_WEBHOOK_URL")  # например https://shop.example.com
+WEBHOOK_PATH = os.getenv("BOOL_SHOP_WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("BOOL_SHOP_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("BOOL_SHOP_WEBHOOK_PORT", "8080"))
+# без явного секрета генерируем свой при старте — Telegram узнает его из setWebhook
+WEBHOOK_SECRET = os.getenv("BOOL_SHOP_WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_QUEUE = 1000
+WEBHOOK_WORKERS = 16
+DRAIN_TIMEOUT = 10.0  # сек на дообработку очереди при остановке
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(self, dp, bot, secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH,
+                 queue_size: int = WEBHOOK_QUEUE, workers: int = WEBHOOK_WORKERS):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.path = path
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._tasks: list[asyncio.Task] = []
+        self.received = 0
+        self.rejected = 0
+        self.processed = 0
+        self.errors = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            return web.Response(status=401)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception:
+                self.errors += 1
+                logger.exception("Ошибка обработки апдейта из webhook")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT):
+        """Дорабатываем то, что уже принято (Telegram считает эти апдейты доставленными)"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook: не успели обработать %d апдейтов", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "received": self.received,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "errors": self.errors,
+        }
+
+
+async def run_webhook(dp, bot, url: str | None = WEBHOOK_URL, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                      server: WebhookServer | None = None):
+    """Поднимает сервер и (если задан url) регистрирует webhook; работает до отмены задачи"""
+    server = server or WebhookServer(dp, bot)
+    workflow_data = {"dispatcher": dp, "bots": [bot], "bot": bot, **dp.workflow_data}
+    await dp.emit_startup(**workflow_data)
+    server.start()
+
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    if url:
+        await bot.set_webhook(
+            url.rstrip("/") + server.path,
+            secret_token=server.secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(server.workers * 2, 100),
+        )
+    print(f"🌐 Webhook слушает {host}:{port}{server.path}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # сначала перестаём принимать, потом дорабатываем очередь
+        await runner.cleanup()
+        await server.stop()
+        await dp.emit_shutdown(**workflow_data)
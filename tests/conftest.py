@@ -0,0 +1,156 @@
+"""Общие фикстуры тестов.
+
+pytest-asyncio не нужен: у каждого теста свой event loop (фикстура loop),
+``async def test_...`` выполняется в нём, и в нём же открываются и
+закрываются хранилища. Фикстура repo прогоняет тест на обоих бэкендах.
+"""
+import asyncio
+import inspect
+import itertools
+import time
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from bool_shop.channel import CaptionDebouncer
+from bool_shop.db import SQLiteRepository
+from bool_shop.handlers import setup_routers
+from bool_shop.loadtest import LocalSession
+from bool_shop.memory import MemoryRepository
+
+
+@pytest.fixture(autouse=True)
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    args = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    pyfuncitem.funcargs["loop"].run_until_complete(pyfuncitem.obj(**args))
+    return True
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    return str(tmp_path / "shop.db")
+
+
+@pytest.fixture
+def sqlite_repo(loop, db_path):
+    repo = SQLiteRepository(db_path)
+    loop.run_until_complete(repo.open())
+    yield repo
+    loop.run_until_complete(repo.close())
+
+
+@pytest.fixture
+def memory_repo(loop):
+    repo = MemoryRepository()
+    loop.run_until_complete(repo.open())
+    yield repo
+    loop.run_until_complete(repo.close())
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def repo(request):
+    return request.getfixturevalue(f"{request.param}_repo")
+
+
+@pytest.fixture
+def age_order():
+    """Переносит created_at заказа в прошлое в обоих бэкендах"""
+    async def age(repo, order_id: int, created_at: int):
+        if isinstance(repo, SQLiteRepository):
+            await repo.pool.execute("UPDATE orders SET created_at = ? WHERE id = ?", (created_at, order_id))
+        else:
+            repo.orders[order_id].created_at = created_at
+
+    return age
+
+
+class RecordingSession(LocalSession):
+    """LocalSession, которая запоминает все вызванные методы Bot API"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        return await super().make_request(bot, method, timeout)
+
+    def texts(self) -> list[str]:
+        return [getattr(m, "text", None) or getattr(m, "caption", None) for m in self.requests]
+
+
+@pytest.fixture
+def bot(loop):
+    """Бот без сети: запросы видны в bot.session.requests"""
+    bot = Bot("42:test", session=RecordingSession())
+    yield bot
+    loop.run_until_complete(bot.session.close())
+
+
+class Shop:
+    """Диспетчер со всеми роутерами бота поверх MemoryRepository; апдейты — как от Telegram"""
+
+    def __init__(self, bot, repo):
+        self.repo = repo
+        self.session = bot.session
+        self.bot = bot
+        self.captions = CaptionDebouncer(self.bot, repo)
+        self.dp = Dispatcher(repo=repo, captions=self.captions)
+        setup_routers(self.dp)
+        self._ids = itertools.count(1)
+
+    def _message(self, user_id: int, **content) -> dict:
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Ann", "username": f"user{user_id}"},
+            **content,
+        }
+
+    async def feed(self, **update):
+        update = Update.model_validate({"update_id": next(self._ids), **update}, context={"bot": self.bot})
+        await self.dp.feed_update(self.bot, update)
+
+    async def send(self, text: str, user_id: int = 1):
+        await self.feed(message=self._message(user_id, text=text))
+
+    async def send_photo(self, file_id: str, user_id: int = 1):
+        photo = {"file_id": file_id, "file_unique_id": file_id, "width": 90, "height": 90}
+        await self.feed(message=self._message(user_id, photo=[photo]))
+
+    async def press(self, data: str, user_id: int = 1):
+        await self.feed(callback_query={
+            "id": str(next(self._ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Ann", "username": f"user{user_id}"},
+            "chat_instance": "1",
+            "message": self._message(user_id, text="card"),
+            "data": data,
+        })
+
+    async def state(self, user_id: int = 1) -> str | None:
+        return await self.dp.fsm.get_context(self.bot, chat_id=user_id, user_id=user_id).get_state()
+
+
+@pytest.fixture
+def shop(loop, bot, memory_repo):
+    shop = Shop(bot, memory_repo)
+    yield shop
+    loop.run_until_complete(shop.captions.close())
+    # роутеры — модульные объекты, а роутер подключается только к одному диспетчеру
+    for router in shop.dp.sub_routers:
+        router._parent_router = None
+    shop.dp.sub_routers.clear()
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from bool_shop.repository import ARCHIVE_AFTER_DAYS
+
+
+async def active_slots(repo, user_id: int) -> int:
+    users, _ = await repo.get_users_page()
+    return next(u.active_slots for u in users if u.tg_id == user_id)
+
+
+async def test_counter_follows_order_status(repo, age_order):
+    await repo.add_user(SimpleNamespace(id=1, username="ann"))
+    slot_id = await repo.add_slot("Nike", "p", ["40", "41"], 100_000, None, "d")
+    first = await repo.create_order(1, slot_id, size="40")
+    second = await repo.create_order(1, slot_id, size="41")
+    assert await active_slots(repo, 1) == 0
+
+    for status in ("paid", "processing", "shipped"):
+        await repo.update_order_status(first, status)
+        assert await active_slots(repo, 1) == 1
+    await repo.update_order_status(second, "paid")
+    assert await active_slots(repo, 1) == 2
+
+    await repo.decline_order(second)
+    await repo.update_order_status(first, "completed")
+    assert await active_slots(repo, 1) == 0
+
+    # архивируются только завершённые заказы — счётчик не трогается
+    await age_order(repo, first, 0)
+    assert await repo.archive_orders(ARCHIVE_AFTER_DAYS * 86400) == 1
+    assert await active_slots(repo, 1) == 0
@@ -0,0 +1,27 @@
+import time
+
+from bool_shop.repository import ARCHIVE_AFTER_DAYS
+
+
+async def test_revenue_includes_archive(repo, age_order):
+    slot_id = await repo.add_slot("Nike", "p", ["40", "41"], 100_000, None, "d")
+    old = await repo.create_order(1, slot_id, size="40")
+    fresh = await repo.create_order(2, slot_id, size="41")
+    for order_id in (old, fresh):
+        await repo.update_order_status(order_id, "completed")
+    await age_order(repo, old, int(time.time()) - (ARCHIVE_AFTER_DAYS + 5) * 86400)
+
+    assert await repo.archive_orders(ARCHIVE_AFTER_DAYS * 86400) == 1
+    assert await repo.get_revenue() == (2, 200_000)
+    assert await repo.get_revenue(int(time.time()) - 86400) == (1, 100_000)
+
+
+async def test_archived_rows_leave_orders_table(sqlite_repo, age_order):
+    slot_id = await sqlite_repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    order_id = await sqlite_repo.create_order(1, slot_id, size="40")
+    await sqlite_repo.update_order_status(order_id, "completed")
+    await age_order(sqlite_repo, order_id, int(time.time()) - (ARCHIVE_AFTER_DAYS + 5) * 86400)
+    assert await sqlite_repo.archive_orders(ARCHIVE_AFTER_DAYS * 86400) == 1
+    async with sqlite_repo.pool.reader() as db:
+        cursor = await db.execute("SELECT (SELECT COUNT(*) FROM orders), (SELECT COUNT(*) FROM orders_archive)")
+        assert tuple(await cursor.fetchone()) == (0, 1)
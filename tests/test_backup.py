@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+import bool_shop.backup as backup
+
+
+async def test_backup_is_consistent_and_rotated(sqlite_repo, tmp_path):
+    directory = tmp_path / "backups"
+    directory.mkdir()
+    for day in range(1, 4):
+        (directory / f"database-2000010{day}-000000.db").write_bytes(b"")
+    slot_id = await sqlite_repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    await sqlite_repo.create_order(1, slot_id, size="40")
+
+    path = await backup.make_backup(sqlite_repo.path, directory=str(directory), keep=2)
+
+    assert backup.list_backups(str(directory)) == [directory / "database-20000103-000000.db", path]
+    assert sorted(p.name for p in directory.iterdir()) == sorted(p.name for p in backup.list_backups(str(directory)))
+    assert await backup.check_integrity(str(path)) == "ok"
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert db.execute("SELECT name, price FROM slots").fetchall() == [("Nike", 100_000)]
+        assert db.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 1
+    finally:
+        db.close()
+
+
+async def test_failed_check_leaves_no_snapshot(sqlite_repo, tmp_path, monkeypatch):
+    async def corrupted(path):
+        return "*** in database main ***"
+
+    monkeypatch.setattr(backup, "check_integrity", corrupted)
+    directory = tmp_path / "backups"
+    with pytest.raises(backup.BackupError):
+        await backup.make_backup(sqlite_repo.path, directory=str(directory))
+    assert list(directory.iterdir()) == []  # ни снимка, ни .tmp
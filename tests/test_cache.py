@@ -0,0 +1,39 @@
+from bool_shop.cache import SlotCache
+
+
+def test_put_after_invalidate_is_ignored():
+    cache = SlotCache()
+    version = cache.version(1)
+    cache.invalidate(1)  # слот изменили, пока его читали из БД
+    cache.put(1, version, "old")
+    assert cache.get(1, default=None) is None
+    cache.put(1, cache.version(1), "new")
+    assert cache.get(1) == "new"
+
+
+def test_lru_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("bool_shop.cache.time.monotonic", lambda: now[0])
+    cache = SlotCache(maxsize=2, ttl=10)
+    for key in (1, 2):
+        cache.put(key, cache.version(key), key)
+    cache.get(1)
+    cache.put(3, cache.version(3), 3)  # вытесняет 2 — к нему дольше всех не обращались
+    assert [cache.get(key, default=None) for key in (1, 2, 3)] == [1, None, 3]
+    now[0] += 11
+    assert cache.get(1, default=None) is None
+    assert cache.stats()["size"] == 1
+
+
+async def test_repository_reads_through_and_invalidates(sqlite_repo):
+    slot_id = await sqlite_repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    await sqlite_repo.get_slot(slot_id)
+    misses = sqlite_repo.cache_stats()["misses"]
+    assert (await sqlite_repo.get_slot(slot_id)).price == 100_000
+    assert sqlite_repo.cache_stats()["misses"] == misses
+
+    await sqlite_repo.update_slot(slot_id, "price", 120_000)
+    assert (await sqlite_repo.get_slot(slot_id)).price == 120_000
+    assert [slot.price for slot in await sqlite_repo.get_slots()] == [120_000]
+    await sqlite_repo.delete_slot(slot_id)
+    assert await sqlite_repo.get_slot(slot_id) is None
@@ -0,0 +1,37 @@
+from bool_shop.cards import CardCache, warm_up
+
+
+async def test_card_is_reused_until_slot_changes(memory_repo):
+    cache = CardCache()
+    slot_id = await memory_repo.add_slot("Nike", "p", ["40", "41"], 100_000, None, "d")
+    card = cache.get(await memory_repo.get_slot(slot_id))
+    assert cache.get(await memory_repo.get_slot(slot_id)) is card
+    assert "Размеры: 40,41" in card.channel_caption
+
+    await memory_repo.reserve_size(slot_id, "40")
+    changed = cache.get(await memory_repo.get_slot(slot_id))
+    assert changed is not card
+    assert "Размеры: 41" in changed.channel_caption and changed.channel_hash != card.channel_hash
+
+    await memory_repo.update_slot(slot_id, "price", 120_000)
+    assert "Цена: 1 200₽" in cache.get(await memory_repo.get_slot(slot_id)).offer_caption
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+
+def test_lru_bound():
+    cache = CardCache(maxsize=2)
+    slots = [
+        {"id": i, "name": f"s{i}", "png": "p", "price": 100, "description": "", "sizes": ["40"], "size": "40"}
+        for i in range(3)
+    ]
+    for slot in slots:
+        cache.get(slot)
+    assert cache.stats()["size"] == 2
+    cache.get(slots[0])  # вытеснен первым
+    assert cache.stats()["misses"] == 4
+
+
+async def test_warm_up_fills_cards(memory_repo):
+    for name in ("a", "b", "c"):
+        await memory_repo.add_slot(name, "p", ["40"], 100, None, "d")
+    assert await warm_up(memory_repo, limit=2) == 2
@@ -0,0 +1,58 @@
+import asyncio
+
+from aiogram.methods import EditMessageCaption
+
+from bool_shop.channel import CaptionDebouncer
+
+
+def edits(bot) -> list[EditMessageCaption]:
+    return [m for m in bot.session.requests if isinstance(m, EditMessageCaption)]
+
+
+async def posted_slot(repo) -> int:
+    slot_id = await repo.add_slot("Nike", "p", ["40", "41", "42"], 100_000, None, "d")
+    await repo.save_slot_post(slot_id, -100, 7)
+    return slot_id
+
+
+async def test_burst_of_sales_is_one_edit(bot, memory_repo):
+    captions = CaptionDebouncer(bot, memory_repo, quiet=0.05, max_delay=1)
+    slot_id = await posted_slot(memory_repo)
+    for size in ("40", "41"):
+        await memory_repo.reserve_size(slot_id, size)
+        captions.schedule(slot_id)
+        await asyncio.sleep(0.01)
+    assert edits(bot) == []
+    await asyncio.sleep(0.1)
+
+    [edit] = edits(bot)
+    assert (edit.chat_id, edit.message_id) == (-100, 7)
+    assert "Размеры: 42" in edit.caption  # последнее состояние, а не промежуточные
+    assert captions.stats() == {"pending": 0, "requested": 2, "edits": 1, "skipped": 0}
+
+    # подпись не изменилась — правка не отправляется
+    captions.schedule(slot_id)
+    await asyncio.sleep(0.1)
+    assert len(edits(bot)) == 1
+    assert captions.skipped == 1
+
+
+async def test_max_delay_bounds_waiting(bot, memory_repo):
+    captions = CaptionDebouncer(bot, memory_repo, quiet=0.05, max_delay=0.1)
+    slot_id = await posted_slot(memory_repo)
+    for size in ("40", "41", "42"):
+        await memory_repo.reserve_size(slot_id, size)
+        captions.schedule(slot_id)
+        await asyncio.sleep(0.04)  # тише quiet не бывает, но max_delay истекает
+    assert len(edits(bot)) == 1
+    await captions.close()
+
+
+async def test_close_flushes_pending(bot, memory_repo):
+    captions = CaptionDebouncer(bot, memory_repo, quiet=10)
+    slot_id = await posted_slot(memory_repo)
+    await memory_repo.reserve_size(slot_id, "40")
+    captions.schedule(slot_id)
+    await captions.close()
+    [edit] = edits(bot)
+    assert "Размеры: 41,42" in edit.caption
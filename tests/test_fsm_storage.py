@@ -0,0 +1,35 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from bool_shop.fsm_storage import SQLiteStorage
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+async def test_keys_being_flushed_are_not_evicted(sqlite_repo):
+    storage = SQLiteStorage(sqlite_repo, cache_size=1, flush_interval=3600)
+    pool = sqlite_repo.pool
+    write = pool.write
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_write(op):
+        started.set()
+        await release.wait()
+        return await write(op)
+
+    await storage.set_state(key(1), "checkout")
+    pool.write = slow_write
+    try:
+        flushing = asyncio.create_task(storage.flush())
+        await started.wait()
+        # чужой ключ вытесняет кэш, пока запись ключа 1 ещё не закоммичена
+        await storage.get_state(key(2))
+        assert await storage.get_state(key(1)) == "checkout"
+        release.set()
+        await flushing
+    finally:
+        pool.write = write
+        await storage.close()
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiogram import Dispatcher, Router
+from aiogram.methods import AnswerCallbackQuery
+from aiogram.types import CallbackQuery, Update
+
+from bool_shop.middlewares import (
+    ACK_ERROR_TEXT, CallbackDedupMiddleware, FastAckMiddleware, UserOrderingMiddleware,
+)
+
+WORKERS = 4  # как воркеры webhook / tasks_concurrency_limit polling
+
+
+def feeder(middleware: UserOrderingMiddleware, handler):
+    slots = asyncio.Semaphore(WORKERS)
+
+    async def feed(user_id: int, n: int):
+        async with slots:
+            return await middleware(handler, n, {"event_from_user": SimpleNamespace(id=user_id)})
+
+    return feed
+
+
+async def test_burst_of_one_user_does_not_delay_others():
+    middleware = UserOrderingMiddleware(limit=100)
+    handled = []
+    finished = {}
+
+    async def handler(event, data):
+        user_id = data["event_from_user"].id
+        if user_id == 1:
+            await asyncio.sleep(0.02)  # ответ идёт через RateLimiter чата
+        handled.append((user_id, event))
+        finished[(user_id, event)] = time.monotonic()
+
+    feed = feeder(middleware, handler)
+    burst = [asyncio.create_task(feed(1, n)) for n in range(40)]
+    await asyncio.sleep(0)
+    started = time.monotonic()
+    await feed(2, 0)
+    other_latency = finished[(2, 0)] - started
+
+    await asyncio.gather(*burst)
+    await middleware.close()
+    assert other_latency < 0.1  # без отдельной очереди ждал бы всю серию: 40 × 20 мс
+    assert [n for user_id, n in handled if user_id == 1] == list(range(40))
+
+
+async def test_overflow_is_dropped():
+    middleware = UserOrderingMiddleware(limit=3)
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(event, data):
+        await release.wait()
+        handled.append(event)
+
+    feed = feeder(middleware, handler)
+    first = asyncio.create_task(feed(1, 0))
+    await asyncio.sleep(0)
+    for n in range(1, 10):
+        await feed(1, n)
+    release.set()
+    await first
+    await middleware.close()
+    assert handled == [0, 1, 2, 3]
+    assert middleware.stats() == {"busy_users": 0, "queued": 0, "deferred": 3, "dropped": 6}
+
+
+def press(bot, data: str = "buy", query_id: str = "q1", message_id: int = 1) -> Update:
+    user = {"id": 1, "is_bot": False, "first_name": "Ann"}
+    return Update.model_validate({
+        "update_id": 1,
+        "callback_query": {
+            "id": query_id,
+            "from": user,
+            "chat_instance": "1",
+            "message": {"message_id": message_id, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "card"},
+            "data": data,
+        },
+    }, context={"bot": bot})
+
+
+def answers(bot) -> list[AnswerCallbackQuery]:
+    return [m for m in bot.session.requests if isinstance(m, AnswerCallbackQuery)]
+
+
+def dispatcher(bot, handler, *middlewares) -> Dispatcher:
+    # свой роутер на каждый тест: роутер подключается только к одному диспетчеру
+    router = Router()
+    router.callback_query()(handler)
+    dp = Dispatcher()
+    for middleware in middlewares:
+        dp.callback_query.outer_middleware(middleware)
+    dp.include_router(router)
+    return dp
+
+
+async def test_slow_handler_is_acked_within_budget(bot):
+    fast_ack = FastAckMiddleware(budget=0.02)
+    bot.session.middleware(fast_ack.session_middleware)
+
+    async def slow(callback: CallbackQuery):
+        await asyncio.sleep(0.1)
+        await callback.answer("Готово")
+
+    dp = dispatcher(bot, slow, fast_ack)
+    started = time.monotonic()
+    waiting = asyncio.create_task(dp.feed_update(bot, press(bot)))
+    while not answers(bot):
+        await asyncio.sleep(0.005)
+    assert time.monotonic() - started < 0.08
+    await waiting
+    # поздний answer хендлера не уходит: второй ответ Telegram отклонил бы
+    assert [a.text for a in answers(bot)] == [None]
+    assert fast_ack.stats() == {"running": 0, "auto_acked": 1, "late_answers": 1, "errors": 0}
+
+
+async def test_handler_answer_within_budget_is_kept(bot):
+    fast_ack = FastAckMiddleware(budget=0.5)
+    bot.session.middleware(fast_ack.session_middleware)
+
+    async def quick(callback: CallbackQuery):
+        await callback.answer("Размер раскупили", show_alert=True)
+
+    await dispatcher(bot, quick, fast_ack).feed_update(bot, press(bot))
+    assert [(a.text, a.show_alert) for a in answers(bot)] == [("Размер раскупили", True)]
+    assert fast_ack.auto_acked == 0
+
+
+async def test_handler_error_is_shown_as_alert(bot):
+    fast_ack = FastAckMiddleware(budget=0.5)
+    bot.session.middleware(fast_ack.session_middleware)
+
+    async def broken(callback: CallbackQuery):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await dispatcher(bot, broken, fast_ack).feed_update(bot, press(bot))
+    assert [(a.text, a.show_alert) for a in answers(bot)] == [(ACK_ERROR_TEXT, True)]
+    assert fast_ack.errors == 1
+
+
+async def test_repeated_press_is_collapsed(bot):
+    dedup = CallbackDedupMiddleware(window=60)
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(callback: CallbackQuery):
+        calls.append(callback.id)
+        await release.wait()
+        if callback.data == "broken":
+            raise RuntimeError("boom")
+
+    dp = dispatcher(bot, handler, dedup)
+    first = asyncio.create_task(dp.feed_update(bot, press(bot, query_id="q1")))
+    await asyncio.sleep(0)
+    await dp.feed_update(bot, press(bot, query_id="q2"))  # пока первое нажатие в работе
+    release.set()
+    await first
+    await dp.feed_update(bot, press(bot, query_id="q3"))  # в окне после завершения
+    await dp.feed_update(bot, press(bot, query_id="q4", message_id=2))  # та же кнопка под другим сообщением
+    assert calls == ["q1", "q4"]
+    assert dedup.collapsed == 2
+    assert [a.callback_query_id for a in answers(bot)] == ["q2", "q3"]
+
+    # упавший хендлер не глушит повтор
+    for query_id in ("q5", "q6"):
+        with pytest.raises(RuntimeError):
+            await dp.feed_update(bot, press(bot, data="broken", query_id=query_id))
+    assert calls[-2:] == ["q5", "q6"]
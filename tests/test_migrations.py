@@ -0,0 +1,76 @@
+import sqlite3
+import time
+
+import pytest
+
+from bool_shop.db import SQLiteRepository
+from bool_shop.migrations import MIGRATIONS, SCHEMA_VERSION, get_version
+
+
+@pytest.fixture
+def baseline_db(db_path):
+    """База, созданная init_db() до миграций: user_version = 0, цены и даты — текст"""
+    db = sqlite3.connect(db_path)
+    for statement in MIGRATIONS[0]:
+        db.execute(statement)
+    db.execute("INSERT INTO users (tg_id, username, buyer, active_slots) VALUES (1, 'ann', 1, 5)")
+    db.execute("INSERT INTO slots (name, png, size, price, description) VALUES ('Nike Air', 'p', '40, 41,40', '1 500₽', '#nike')")
+    db.execute("INSERT INTO orders (user_id, username, slot_id, size, status, created_at) "
+               "VALUES (1, 'ann', 1, '41', 'paid', '2024-01-02 03:04:05')")
+    db.commit()
+    db.close()
+    return db_path
+
+
+async def test_baseline_schema_migrates_to_current(baseline_db):
+    repo = SQLiteRepository(baseline_db)
+    await repo.open()
+    try:
+        async with repo.pool.reader() as db:
+            assert await get_version(db) == SCHEMA_VERSION
+        slot = await repo.get_slot(1)
+        assert slot.price == 150_000
+        assert slot.sizes == ["40", "41"]
+        async with repo.pool.reader() as db:
+            cursor = await db.execute("SELECT size, qty FROM slot_sizes WHERE slot_id = 1 ORDER BY rowid")
+            assert [tuple(row) for row in await cursor.fetchall()] == [("40", 2), ("41", 1)]
+        users, _ = await repo.get_users_page()
+        assert [(user.tg_id, user.active_slots) for user in users] == [(1, 1)]
+        assert await repo.search_slots("nike") == ([1], 1)
+    finally:
+        await repo.close()
+
+    # повторное открытие ничего не применяет
+    repo = SQLiteRepository(baseline_db)
+    await repo.open()
+    try:
+        assert (await repo.get_order(1)).price == 150_000
+    finally:
+        await repo.close()
+
+
+async def test_user_orders_read_covering_index(sqlite_repo):
+    async with sqlite_repo.pool.reader() as db:
+        cursor = await db.execute(
+            "EXPLAIN QUERY PLAN SELECT id, slot_id, size, address, status FROM orders "
+            "WHERE user_id = ? ORDER BY created_at DESC", (1,)
+        )
+        plan = [row[3] for row in await cursor.fetchall()]
+    assert plan == ["SEARCH orders USING COVERING INDEX idx_orders_user_created (user_id=?)"]
+
+
+async def test_text_timestamps_become_utc_epoch(baseline_db):
+    repo = SQLiteRepository(baseline_db)
+    await repo.open()
+    try:
+        # CURRENT_TIMESTAMP писал UTC: '2024-01-02 03:04:05' -> epoch без сдвига пояса
+        assert (await repo.get_order(1)).created_at == 1704164645
+        slot_id = await repo.add_slot("Puma", "p", ["42"], 100_000, None, "d")
+        before = int(time.time())
+        order = await repo.get_order(await repo.create_order(1, slot_id, size="42"))
+        assert isinstance(order.created_at, int) and before <= order.created_at <= time.time()
+        async with repo.pool.reader() as db:
+            cursor = await db.execute("SELECT DISTINCT typeof(created_at) FROM orders")
+            assert [row[0] for row in await cursor.fetchall()] == ["integer"]
+    finally:
+        await repo.close()
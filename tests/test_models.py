@@ -0,0 +1,34 @@
+import pytest
+
+from bool_shop.db import SLOT_LIST_ROW
+from bool_shop.models import Order, Slot
+
+
+def test_record_reads_as_attributes_and_mapping():
+    order = Order(id=1, status="paid")
+    assert order.status == order["status"] == order.get("status") == "paid"
+    assert order.address is None
+    assert order.get("missing", "-") == "-"
+    with pytest.raises(KeyError):
+        order["missing"]
+    assert not hasattr(order, "__dict__")
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(TypeError, match="nickname"):
+        Order(id=1, nickname="x")
+
+
+def test_factory_fills_columns_missing_from_select():
+    slot = SLOT_LIST_ROW(None, (7, "Nike", 100_000, 42))
+    assert (slot.id, slot.name, slot.price, slot.user_id) == (7, "Nike", 100_000, 42)
+    assert slot.png is None and slot.sizes is None
+    assert slot.size == ""
+
+
+async def test_repository_rows_are_records(repo):
+    slot_id = await repo.add_slot("Nike", "p", ["40", "41"], 100_000, None, "d")
+    slot = await repo.get_slot(slot_id)
+    assert isinstance(slot, Slot)
+    assert slot.size == "40,41"
+    assert {key: slot[key] for key in slot.keys()}["price"] == 100_000
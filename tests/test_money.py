@@ -0,0 +1,53 @@
+import sqlite3
+
+import aiosqlite
+import pytest
+
+from bool_shop.migrations import MIGRATIONS, migrate
+
+
+@pytest.fixture
+def legacy_db(loop, db_path):
+    """База до миграции 6: цена слота — текст"""
+    async def make(price: str):
+        db = await aiosqlite.connect(db_path, isolation_level=None)
+        for statements in MIGRATIONS[:5]:
+            for statement in statements:
+                await db.execute(statement)
+        await db.execute("PRAGMA user_version = 5")
+        await db.execute("INSERT INTO slots (name, png, price) VALUES ('Nike', 'p', ?)", (price,))
+        connections.append(db)
+        return db
+
+    connections = []
+    yield make
+    for db in connections:
+        loop.run_until_complete(db.close())
+
+
+async def test_migration_parses_legacy_prices(legacy_db):
+    db = await legacy_db("1 499,90₽")
+    await migrate(db)
+    cursor = await db.execute("SELECT price FROM slots")
+    assert (await cursor.fetchone())[0] == 149990
+
+
+async def test_migration_fails_on_unparsable_price(legacy_db):
+    db = await legacy_db("договорная")
+    with pytest.raises(sqlite3.OperationalError):
+        await migrate(db)
+    cursor = await db.execute("SELECT price FROM slots")
+    assert (await cursor.fetchone())[0] == "договорная"
+
+
+async def test_revenue_uses_order_price(repo):
+    slot_id = await repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    order_id = await repo.create_order(1, slot_id, size="40")
+    await repo.update_order_status(order_id, "completed")
+    await repo.update_slot(slot_id, "price", 250_000)
+    assert await repo.get_revenue() == (1, 100_000)
+    assert (await repo.get_order(order_id)).price == 100_000
+    await repo.delete_slot(slot_id)
+    assert await repo.get_revenue() == (1, 100_000)
+    order = await repo.get_order(order_id)
+    assert (order.price, order.slot_name) == (100_000, None)
@@ -0,0 +1,15 @@
+async def test_payment_caption_uses_order_price(shop):
+    slot_id = await shop.repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    await shop.press(f"checkout:{slot_id}")
+    await shop.press(f"size:{slot_id}:40")
+    # после оформления цену слота поменяли, а потом слот удалили совсем
+    await shop.repo.update_slot(slot_id, "price", 250_000)
+    await shop.repo.delete_slot(slot_id)
+
+    await shop.send_photo("proof")
+    assert "✅ Чек отправлен администратору на проверку" in shop.session.texts()
+    [notification] = shop.repo.outbox.values()
+    assert notification.photo == "proof"
+    assert "Цена: 1 000₽" in notification.text
+    assert "Товар: —" in notification.text
+    assert await shop.state() is None
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+import bool_shop.outbox as outbox
+from bool_shop.outbox import OutboxSender
+
+
+class FlakyBot:
+    """send_message, который падает по заданным чатам"""
+
+    def __init__(self, network_down=(), blocked=()):
+        self.network_down = set(network_down)
+        self.blocked = set(blocked)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=SendMessage(chat_id=chat_id, text=text), message="bot was blocked")
+        if chat_id in self.network_down:
+            raise ConnectionError("network is down")
+        self.sent.append((chat_id, text))
+
+
+async def pending_order(repo) -> int:
+    slot_id = await repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    return await repo.create_order(1, slot_id, size="40")
+
+
+async def test_failed_message_holds_back_its_chat_only(repo):
+    order_id = await pending_order(repo)
+    await repo.update_order_status(order_id, "paid", notify=[
+        outbox.message(10, "a1"), outbox.message(20, "b1"), outbox.message(10, "a2"), outbox.message(30, "c1"),
+    ])
+    bot = FlakyBot(network_down={10}, blocked={30})
+    sender = OutboxSender(bot, repo)
+
+    assert await sender.drain() == 4
+    assert bot.sent == [(20, "b1")]
+    assert sender.stats() == {"sent": 1, "retried": 1, "dropped": 1}
+    assert await repo.get_outbox(time.time(), 10) == []
+    later = await repo.get_outbox(time.time() + outbox.OUTBOX_BACKOFF + 1, 10)
+    assert [(n.text, n.attempts) for n in later] == [("a1", 1), ("a2", 0)]
+
+    bot.network_down.clear()
+    await repo.retry_outbox([(n.id, 0, False) for n in later])
+    assert await sender.drain() == 2
+    assert bot.sent == [(20, "b1"), (10, "a1"), (10, "a2")]
+    assert await repo.get_outbox(time.time() + 3600, 10) == []
+
+
+async def test_gives_up_after_max_attempts(repo):
+    order_id = await pending_order(repo)
+    await repo.update_order_status(order_id, "paid", notify=[outbox.message(10, "a1")])
+    sender = OutboxSender(FlakyBot(network_down={10}), repo, max_attempts=2)
+    for _ in range(2):
+        [item] = await repo.get_outbox(time.time() + 3600, 10)
+        await repo.retry_outbox([(item.id, 0, False)])
+        await sender.drain()
+    assert await repo.get_outbox(time.time() + 3600, 10) == []
+    assert sender.dropped == 1
+
+
+async def test_sender_wakes_on_write(repo):
+    bot = FlakyBot()
+    sender = asyncio.create_task(OutboxSender(bot, repo, poll=60).run())
+    try:
+        await asyncio.sleep(0.01)
+        order_id = await pending_order(repo)
+        await repo.update_order_status(order_id, "paid", notify=[outbox.message(10, "paid")])
+        for _ in range(100):
+            if bot.sent:
+                break
+            await asyncio.sleep(0.01)
+        assert bot.sent == [(10, "paid")]
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
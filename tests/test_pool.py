@@ -0,0 +1,39 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from bool_shop.db import READERS
+
+
+async def test_pool_runs_in_wal_with_read_only_readers(sqlite_repo):
+    pool = sqlite_repo.pool
+    async with pool.reader() as db:
+        cursor = await db.execute("PRAGMA journal_mode")
+        assert (await cursor.fetchone())[0] == "wal"
+        with pytest.raises(sqlite3.OperationalError):
+            await db.execute("INSERT INTO users (tg_id, username) VALUES (1, 'a')")
+    assert len(pool._connections) == READERS + 1
+
+
+async def test_readers_see_committed_writes_and_do_not_wait_for_writer(sqlite_repo):
+    pool = sqlite_repo.pool
+    await pool.execute("INSERT INTO users (tg_id, username) VALUES (1, 'a')")
+    inside, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_op(db):
+        await db.execute("INSERT INTO users (tg_id, username) VALUES (2, 'b')")
+        inside.set()
+        await release.wait()
+
+    writing = asyncio.create_task(pool.write(slow_op))
+    await inside.wait()
+    # транзакция писателя открыта: читатель не блокируется и видит только закоммиченное
+    async with pool.reader() as db:
+        cursor = await asyncio.wait_for(db.execute("SELECT tg_id FROM users ORDER BY tg_id"), 1)
+        assert [row[0] for row in await cursor.fetchall()] == [1]
+    release.set()
+    await writing
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT tg_id FROM users ORDER BY tg_id")
+        assert [row[0] for row in await cursor.fetchall()] == [1, 2]
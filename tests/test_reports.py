@@ -0,0 +1,70 @@
+import time
+from types import SimpleNamespace
+
+from bool_shop.repository import ARCHIVE_AFTER_DAYS, order_key
+
+
+async def walk(fetch, key, limit):
+    """Листает вперёд до конца, потом назад до начала; возвращает оба прохода"""
+    forward, after, pages = [], None, []
+    while True:
+        rows, has_more = await fetch(after=after, limit=limit)
+        pages.append(rows)
+        forward += rows
+        if not has_more:
+            break
+        after = key(rows[-1])
+    backward, before = list(pages[-1]), key(pages[-1][0])
+    while True:
+        rows, has_more = await fetch(before=before, limit=limit)
+        backward = rows + backward
+        if not has_more:
+            break
+        before = key(rows[0])
+    return forward, backward
+
+
+async def test_orders_pages_cover_history_once(repo, age_order):
+    for user_id in (1, 2):
+        await repo.add_user(SimpleNamespace(id=user_id, username=f"u{user_id}"))
+    slot_id = await repo.add_slot("Nike", "p", [str(size) for size in range(30, 40)], 100_000, None, "d")
+    now = int(time.time())
+    ids = []
+    for n in range(9):
+        order_id = await repo.create_order(1 + n % 2, slot_id, size=str(30 + n))
+        # по три заказа на одну секунду: порядок внутри секунды решает id
+        await age_order(repo, order_id, now - (ARCHIVE_AFTER_DAYS + 3 - n // 3) * 86400)
+        ids.append(order_id)
+    for order_id in ids[:4]:
+        await repo.update_order_status(order_id, "completed")
+    await repo.update_order_status(ids[-1], "paid")
+    assert await repo.archive_orders(ARCHIVE_AFTER_DAYS * 86400) == 4
+
+    async def history(**page):
+        return await repo.get_orders_page(**page)
+
+    forward, backward = await walk(history, order_key, limit=2)
+    expected = sorted(ids, key=lambda i: (ids.index(i) // 3, i), reverse=True)
+    assert [o.id for o in forward] == [o.id for o in backward] == expected
+    assert forward[0].username == "u1" and forward[0].slot_name == "Nike"
+
+    rows, has_more = await repo.get_orders_page(active=True, limit=2)
+    assert [o.id for o in rows] == [ids[-1]] and not has_more
+
+
+async def test_users_pages(repo):
+    for user_id in range(1, 8):
+        await repo.add_user(SimpleNamespace(id=user_id, username=f"u{user_id}"))
+    for user_id in (2, 5, 6):
+        await repo.mark_as_buyer(user_id)
+
+    async def users(**page):
+        return await repo.get_users_page(**page)
+
+    async def buyers(**page):
+        return await repo.get_users_page(buyers_only=True, **page)
+
+    forward, backward = await walk(users, lambda u: u.tg_id, limit=3)
+    assert [u.tg_id for u in forward] == [u.tg_id for u in backward] == list(range(1, 8))
+    forward, backward = await walk(buyers, lambda u: u.tg_id, limit=2)
+    assert [u.tg_id for u in forward] == [u.tg_id for u in backward] == [2, 5, 6]
@@ -0,0 +1,29 @@
+import time
+
+from bool_shop.db import EXPIRED_RESERVATIONS_SQL
+
+
+async def test_expired_reservations_use_partial_index(sqlite_repo):
+    async with sqlite_repo.pool.reader() as db:
+        cursor = await db.execute(f"EXPLAIN QUERY PLAN {EXPIRED_RESERVATIONS_SQL}", (0, 1))
+        plan = [row[3] for row in await cursor.fetchall()]
+    assert len(plan) == 1
+    assert plan[0].startswith("SEARCH orders USING INDEX idx_orders_reserved_until")
+
+
+async def test_expired_reservation_returns_stock(repo):
+    slot_id = await repo.add_slot("Nike", "p", ["40"], 100_000, None, "d")
+    expired = await repo.create_order(1, slot_id, size="40", reserve_for=-1)
+    assert await repo.create_order(2, slot_id, size="40", reserve_for=60) is None
+    assert await repo.expire_reservations(int(time.time())) == {slot_id}
+    assert (await repo.get_order(expired)).status == "expired"
+    assert (await repo.get_slot(slot_id)).sizes == ["40"]
+
+
+async def test_create_order_is_idempotent(repo):
+    slot_id = await repo.add_slot("Nike", "p", ["40", "41"], 100_000, None, "d")
+    first = await repo.create_order(1, slot_id, size="40", idempotency_key="1:7:size:40", reserve_for=60)
+    again = await repo.create_order(1, slot_id, size="40", idempotency_key="1:7:size:40", reserve_for=60)
+    assert again == first
+    assert (await repo.get_slot(slot_id)).sizes == ["41"]  # размер списан один раз
+    assert await repo.create_order(1, slot_id, size="41", idempotency_key="1:8:size:41") != first
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from bool_shop.scheduler import CronSpec, Scheduler
+
+
+@pytest.mark.parametrize("spec, moment, expected", [
+    ("0 */6 * * *", datetime(2026, 3, 1, 5, 59, 30), datetime(2026, 3, 1, 6, 0)),
+    ("0 */6 * * *", datetime(2026, 3, 1, 6, 0), datetime(2026, 3, 1, 12, 0)),
+    ("30 2 * * 0", datetime(2026, 3, 2, 0, 0), datetime(2026, 3, 8, 2, 30)),  # воскресенье
+    ("0 0 29 2 *", datetime(2026, 3, 1, 0, 0), datetime(2028, 2, 29, 0, 0)),
+    ("5/20 1-2 * * *", datetime(2026, 3, 1, 1, 30), datetime(2026, 3, 1, 1, 45)),
+    # заданы и день месяца, и день недели: подходит любой
+    ("0 9 1 * 1", datetime(2026, 3, 1, 10, 0), datetime(2026, 3, 2, 9, 0)),
+])
+def test_cron_next_after(spec, moment, expected):
+    assert CronSpec(spec).next_after(moment) == expected
+
+
+@pytest.mark.parametrize("spec", ["* * * *", "60 * * * *", "x * * * *", "*/0 * * * *", "0 0 31 2 *"])
+def test_invalid_cron_fails_at_registration(spec):
+    with pytest.raises(ValueError):
+        Scheduler().cron("job", spec, lambda: None)
+
+
+async def test_overlapping_run_is_skipped_and_stop_drains():
+    scheduler = Scheduler(drain_timeout=1)
+    started, finished = asyncio.Event(), []
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(0.08)
+        finished.append(True)
+
+    job = scheduler.every("slow", 0.03, slow, at_start=True)
+    await scheduler.start()
+    await started.wait()
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+    # запуск через 0.03 с пропущен, первый доработал, а не отменён
+    assert job.skipped >= 1
+    assert finished == [True]
+    stats = job.stats()
+    assert stats["runs"] == 1 and stats["running"] is False and stats["next_run"] is None
+    assert stats["max_duration"] >= 0.07
+
+
+async def test_failure_is_counted_and_schedule_continues():
+    scheduler = Scheduler()
+    calls = []
+
+    async def flaky():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    job = scheduler.every("flaky", 0.01, flaky)
+    await scheduler.start()
+    while job.runs < 3:
+        await asyncio.sleep(0.01)
+    await scheduler.stop()
+    assert job.failures == 1
+    assert job.last_error == "RuntimeError: boom"
+
+
+async def test_stop_cancels_jobs_past_drain_timeout():
+    scheduler = Scheduler(drain_timeout=0.02)
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(10)
+
+    job = scheduler.once("hang", hang)
+    await scheduler.start()
+    await started.wait()
+    await scheduler.stop()
+    assert not job.running
+    assert job.runs == 1
@@ -0,0 +1,69 @@
+from aiogram.methods import EditMessageMedia
+
+from bool_shop.states import OrderFSM, SearchFSM
+
+REFUSED = "⚠ Сначала завершите оформление или ищите сразу: /search <запрос>"
+
+
+async def test_search_during_checkout_keeps_order_state(shop):
+    slot_id = await shop.repo.add_slot("Nike Air", "p", ["40"], 100_000, None, "#nike")
+    await shop.press(f"checkout:{slot_id}")
+    await shop.press(f"size:{slot_id}:40")
+    assert await shop.state() == OrderFSM.waiting_for_proof.state
+
+    await shop.send("/search")
+    await shop.press("search")
+    assert shop.session.texts()[-2:] == [REFUSED, None]  # второе — answerCallbackQuery
+    assert await shop.state() == OrderFSM.waiting_for_proof.state
+
+    await shop.send("/search nike")
+    assert "Nike Air" in shop.session.texts()[-1]
+    assert await shop.state() == OrderFSM.waiting_for_proof.state
+
+    await shop.send_photo("proof")
+    assert shop.session.texts()[-1] == "✅ Чек отправлен администратору на проверку"
+    assert (await shop.repo.get_order(1)).proof == "proof"
+
+
+async def test_query_on_next_message(shop):
+    await shop.repo.add_slot("Nike Air", "p", ["40"], 100_000, None, "#nike")
+    await shop.press("search")
+    assert await shop.state() == SearchFSM.waiting_query.state
+    await shop.send("nike")
+    assert "Nike Air" in shop.session.texts()[-1]
+    assert await shop.state() is None
+
+
+async def test_command_is_not_taken_as_query(shop):
+    await shop.send("/search")
+    await shop.send("/start")
+    assert await shop.state() is None
+    assert "Boll Shop" in shop.session.texts()[-1]
+    assert "/start" not in [getattr(m, "text", None) for m in shop.session.requests]
+
+
+async def test_photo_is_not_a_query(shop):
+    await shop.press("search")
+    await shop.send_photo("pic")
+    assert shop.session.texts()[-1] == "⚠ Отправьте запрос текстом."
+    assert await shop.state() == SearchFSM.waiting_query.state
+
+
+async def test_name_outranks_hashtag_and_pages(repo):
+    tagged = await repo.add_slot("Худи", "p", ["M"], 100_000, None, "#nike #худи")
+    named = await repo.add_slot("Nike Air Max", "p", ["40"], 100_000, None, "#кроссовки")
+    await repo.add_slot("Puma", "p", ["41"], 100_000, None, "#кроссовки")
+    assert await repo.search_slots("nik") == ([named, tagged], 2)
+    assert await repo.search_slots("nike", offset=1, limit=1) == ([tagged], 2)
+    assert await repo.search_slots("nike air") == ([named], 1)
+    assert await repo.search_slots("!!!") == ([], 0)
+
+
+async def test_flip_through_results(shop):
+    await shop.repo.add_slot("Nike Air", "p1", ["40"], 100_000, None, "#nike")
+    await shop.repo.add_slot("Худи", "p2", ["M"], 100_000, None, "#nike")
+    await shop.send("/search nike")
+    await shop.press("search:1")
+    edit = shop.session.requests[-2]
+    assert isinstance(edit, EditMessageMedia)
+    assert edit.media.media == "p2"
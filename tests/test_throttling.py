@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, GetUpdates, SendMessage
+
+from bool_shop.throttling import RateLimiter
+
+
+def flaky(method, retry_after=1, failures=1):
+    calls = []
+
+    async def make_request(bot, m):
+        calls.append(m)
+        if len(calls) <= failures:
+            raise TelegramRetryAfter(method=m, message="Too Many Requests", retry_after=retry_after)
+        return True
+
+    return make_request, calls
+
+
+async def test_unlimited_methods_retry_on_429(monkeypatch):
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr("bool_shop.throttling.asyncio.sleep", fake_sleep)
+    limiter = RateLimiter()
+    method = AnswerCallbackQuery(callback_query_id="1")
+    make_request, calls = flaky(method, retry_after=3)
+
+    assert await limiter(make_request, None, method) is True
+    assert len(calls) == 2
+    assert slept == [3]
+    assert limiter.retried == 1
+
+
+async def test_chat_429_pauses_global_bucket():
+    limiter = RateLimiter()
+    limited = asyncio.Event()
+
+    async def make_request(bot, m):
+        if m.chat_id == 1 and not limited.is_set():
+            limited.set()
+            raise TelegramRetryAfter(method=m, message="Too Many Requests", retry_after=0.3)
+        return True
+
+    first = asyncio.create_task(limiter(make_request, None, SendMessage(chat_id=1, text="a")))
+    await limited.wait()
+    # другой чат после 429 тоже ждёт: бот целиком на паузе
+    started = time.monotonic()
+    await limiter(make_request, None, SendMessage(chat_id=2, text="b"))
+    await first
+    assert time.monotonic() - started >= 0.25
+
+
+async def test_unlimited_methods_have_timeout():
+    limiter = RateLimiter(timeout=0.05)
+
+    async def hang(bot, m):
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await limiter(hang, None, AnswerCallbackQuery(callback_query_id="1"))
+    assert limiter.timeouts == 1
+
+
+async def test_get_updates_is_not_wrapped():
+    limiter = RateLimiter(timeout=0.01)
+
+    async def long_poll(bot, m):
+        await asyncio.sleep(0.05)
+        return []
+
+    assert await limiter(long_poll, None, GetUpdates(timeout=30)) == []
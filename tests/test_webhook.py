@@ -0,0 +1,40 @@
+from aiohttp.test_utils import TestClient, TestServer
+
+from bool_shop.loadtest import fake_update
+from bool_shop.webhook import SECRET_HEADER, WebhookServer
+
+
+async def post(server: WebhookServer, *bodies, secret: str = "s3cret") -> list[int]:
+    async with TestClient(TestServer(server.app())) as client:
+        statuses = []
+        for body in bodies:
+            kwargs = {"data": body} if isinstance(body, str) else {"json": body}
+            response = await client.post(server.path, headers={SECRET_HEADER: secret}, **kwargs)
+            statuses.append(response.status)
+        return statuses
+
+
+async def test_secret_and_body_are_checked(shop):
+    server = WebhookServer(shop.dp, shop.bot, secret="s3cret")
+    assert await post(server, fake_update(1, 1, "/start"), secret="wrong") == [401]
+    assert await post(server, "not json") == [400]
+    assert server.stats()["received"] == 0
+
+
+async def test_accepted_updates_are_processed(shop):
+    server = WebhookServer(shop.dp, shop.bot, secret="s3cret", workers=2)
+    server.start()
+    assert await post(server, fake_update(1, 1, "/start"), fake_update(2, 2, "/help")) == [200, 200]
+    await server.stop()
+    assert server.stats() == {"queued": 0, "received": 2, "rejected": 0, "processed": 2, "errors": 0}
+    assert len(shop.session.requests) == 2
+
+
+async def test_full_queue_answers_503(shop):
+    server = WebhookServer(shop.dp, shop.bot, secret="s3cret", queue_size=1)
+    # воркеры не запущены: первый апдейт занимает очередь
+    assert await post(server, fake_update(1, 1, "/start"), fake_update(2, 1, "/start")) == [200, 503]
+    assert server.stats()["rejected"] == 1
+    server.start()
+    await server.stop()
+    assert server.processed == 1
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+
+class FailingRollback:
+    """Соединение, у которого COMMIT и ROLLBACK один раз падают"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.broken = {"COMMIT", "ROLLBACK"}
+
+    @property
+    def in_transaction(self):
+        return self.conn.in_transaction
+
+    async def execute(self, sql, params=()):
+        if sql in self.broken:
+            self.broken.discard(sql)
+            raise RuntimeError(f"{sql} failed")
+        return await self.conn.execute(sql, params)
+
+
+async def user_ids(repo) -> list[int]:
+    async with repo.pool.reader() as db:
+        cursor = await db.execute("SELECT tg_id FROM users ORDER BY tg_id")
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def test_failed_rollback_does_not_stop_writer(sqlite_repo):
+    queue = sqlite_repo.pool._queue
+    conn = queue.conn
+    queue.conn = FailingRollback(conn)
+    try:
+        with pytest.raises(RuntimeError, match="COMMIT failed"):
+            await sqlite_repo.pool.execute("INSERT INTO users (tg_id, username) VALUES (1, 'a')")
+        await asyncio.wait_for(sqlite_repo.pool.execute("INSERT INTO users (tg_id, username) VALUES (2, 'b')"), 5)
+    finally:
+        queue.conn = conn
+    assert await user_ids(sqlite_repo) == [2]
+
+
+async def test_crashed_batch_fails_its_futures_only(sqlite_repo):
+    queue = sqlite_repo.pool._queue
+    commit = queue._commit
+
+    async def crash_once(batch):
+        queue._commit = commit
+        raise RuntimeError("boom")
+
+    queue._commit = crash_once
+    with pytest.raises(RuntimeError, match="boom"):
+        await sqlite_repo.pool.execute("INSERT INTO users (tg_id, username) VALUES (1, 'a')")
+    await asyncio.wait_for(sqlite_repo.pool.execute("INSERT INTO users (tg_id, username) VALUES (2, 'b')"), 5)
+    assert await user_ids(sqlite_repo) == [2]